@@ -0,0 +1,179 @@
+"""Headless batch voucher generation.
+
+Runs the same parsing, column mapping and rendering as the API without the
+FastAPI server or the frontend:
+
+    python cli.py bookings.xlsx --output-dir out --workers 8
+"""
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime
+from enum import Enum
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+import hashlib
+import json
+import os
+import zipfile
+
+import typer
+from jinja2 import Template
+
+from vouchers import (
+    decode_vouchers,
+    map_excel_data_to_template,
+    parse_excel_workbook,
+    render_voucher_pdf,
+    voucher_pdf_filename,
+    voucher_template,
+)
+
+app = typer.Typer(help="Hotel voucher batch generator")
+
+CHECKPOINT_FILENAME = ".voucher_checkpoint.json"
+
+class OutputFormat(str, Enum):
+    pdf = "pdf"
+    zip = "zip"
+
+# Compiled once per worker process
+_template: Optional[Template] = None
+
+def load_rows(input_path: Path, sheets: Optional[List[str]] = None) -> List[Tuple[int, Dict[str, Any]]]:
+    """Load (row_number, data) pairs from an Excel workbook or an exported JSON file"""
+    if input_path.suffix.lower() in ('.xlsx', '.xls'):
+        parsed_sheets = parse_excel_workbook(input_path.read_bytes(), sheets)
+        rows = [row for sheet in parsed_sheets for row in sheet["rows"]]
+        return [(i + 1, row) for i, row in enumerate(rows)]
+
+    if input_path.suffix.lower() == '.json':
+        payload = json.loads(input_path.read_text())
+        # Accept a bare voucher list, a columnar payload or a saved /api/upload-excel response
+        if isinstance(payload, dict) and "vouchers" in payload:
+            payload = payload["vouchers"]
+        vouchers = decode_vouchers(payload)
+        return [
+            (voucher.get("row_number", i + 1), voucher.get("data", {}))
+            for i, voucher in enumerate(vouchers)
+        ]
+
+    raise typer.BadParameter("Input must be an Excel (.xlsx/.xls) or JSON file", param_hint="INPUT_PATH")
+
+def render_chunk(rows: List[Tuple[int, Dict[str, Any]]], output_dir: str) -> List[str]:
+    """Render a chunk of rows to PDF files inside a worker process"""
+    global _template
+    if _template is None:
+        _template = voucher_template()
+
+    pdf_files = []
+    for row_number, data in rows:
+        pdf_filename, pdf_content = render_voucher_pdf(_template, data, row_number)
+        pdf_path = os.path.join(output_dir, pdf_filename)
+        with open(pdf_path, 'wb') as pdf_file:
+            pdf_file.write(pdf_content)
+        pdf_files.append(pdf_path)
+    return pdf_files
+
+def input_fingerprint(input_path: Path, sheets: Optional[List[str]] = None) -> str:
+    """Identify the input a checkpoint belongs to by its content and sheet selection"""
+    digest = hashlib.sha256()
+    with open(input_path, 'rb') as input_file:
+        for block in iter(lambda: input_file.read(1024 * 1024), b''):
+            digest.update(block)
+    digest.update(json.dumps(sorted(sheets or [])).encode())
+    return digest.hexdigest()
+
+def read_checkpoint(checkpoint_path: Path, fingerprint: str) -> int:
+    """Return the first row that still needs rendering, or 1 if the checkpoint is for another input"""
+    if not checkpoint_path.exists():
+        return 1
+    checkpoint = json.loads(checkpoint_path.read_text())
+    if checkpoint.get("input") != fingerprint:
+        typer.echo("Ignoring checkpoint from a different input file")
+        return 1
+    return checkpoint.get("next_row", 1)
+
+def write_checkpoint(checkpoint_path: Path, fingerprint: str, next_row: int) -> None:
+    """Atomically record the first row that has not been rendered yet"""
+    tmp_path = checkpoint_path.with_suffix('.tmp')
+    tmp_path.write_text(json.dumps({
+        "input": fingerprint,
+        "next_row": next_row,
+        "updated_at": datetime.now().isoformat()
+    }))
+    os.replace(tmp_path, checkpoint_path)
+
+@app.command()
+def generate(
+    input_path: Path = typer.Argument(..., exists=True, dir_okay=False, help="Excel workbook or JSON voucher file"),
+    output_dir: Path = typer.Option(Path("vouchers"), "--output-dir", "-o", help="Directory for generated files"),
+    output_format: OutputFormat = typer.Option(OutputFormat.zip, "--format", "-f", help="Write loose PDFs or a single ZIP"),
+    workers: int = typer.Option(os.cpu_count() or 1, "--workers", "-w", min=1, help="Number of render processes"),
+    chunk_size: int = typer.Option(100, "--chunk-size", "-c", min=1, help="Rows rendered per worker task"),
+    resume_from: Optional[int] = typer.Option(None, "--resume-from", min=1, help="First row to render; defaults to the saved checkpoint"),
+    fresh: bool = typer.Option(False, "--fresh", help="Ignore any saved checkpoint and start from row 1"),
+    sheets: Optional[List[str]] = typer.Option(None, "--sheet", help="Only parse these sheets (repeatable)"),
+):
+    """Generate vouchers for every row of INPUT_PATH"""
+    output_dir.mkdir(parents=True, exist_ok=True)
+    checkpoint_path = output_dir / CHECKPOINT_FILENAME
+
+    rows = load_rows(input_path, sheets)
+    fingerprint = input_fingerprint(input_path, sheets)
+    if resume_from is None:
+        resume_from = 1 if fresh else read_checkpoint(checkpoint_path, fingerprint)
+    pending = [row for row in rows if row[0] >= resume_from]
+    typer.echo(f"Loaded {len(rows)} rows, {len(pending)} to render from row {resume_from}")
+
+    chunks = [pending[i:i + chunk_size] for i in range(0, len(pending), chunk_size)]
+    # The checkpoint only advances past chunks whose predecessors have all finished
+    done = [False] * len(chunks)
+    next_chunk = 0
+    rendered = 0
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        in_flight = {}
+        submitted = 0
+        while submitted < len(chunks) or in_flight:
+            # Keep at most two chunks per worker queued so memory stays bounded
+            while submitted < len(chunks) and len(in_flight) < workers * 2:
+                future = executor.submit(render_chunk, chunks[submitted], str(output_dir))
+                in_flight[future] = submitted
+                submitted += 1
+
+            finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in finished:
+                index = in_flight.pop(future)
+                rendered += len(future.result())
+                done[index] = True
+
+            while next_chunk < len(chunks) and done[next_chunk]:
+                next_chunk += 1
+            if next_chunk < len(chunks):
+                write_checkpoint(checkpoint_path, fingerprint, chunks[next_chunk][0][0])
+            typer.echo(f"Rendered {rendered}/{len(pending)} vouchers")
+
+    # Every row is rendered; a checkpoint would only make the next run skip work
+    checkpoint_path.unlink(missing_ok=True)
+
+    if output_format == OutputFormat.zip:
+        zip_path = output_dir / f"hotel_vouchers_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"
+        # Only this input's vouchers, including those rendered before a resume
+        pdf_paths = [
+            output_dir / voucher_pdf_filename(map_excel_data_to_template(data), row_number)
+            for row_number, data in rows
+        ]
+        missing = [pdf_path for pdf_path in pdf_paths if not pdf_path.exists()]
+        if missing:
+            typer.echo(f"Warning: {len(missing)} vouchers before row {resume_from} were never rendered and are not archived")
+            pdf_paths = [pdf_path for pdf_path in pdf_paths if pdf_path.exists()]
+        with zipfile.ZipFile(zip_path, 'w') as zipf:
+            for pdf_path in pdf_paths:
+                zipf.write(pdf_path, pdf_path.name)
+        for pdf_path in pdf_paths:
+            pdf_path.unlink()
+        typer.echo(f"Wrote {len(pdf_paths)} vouchers to {zip_path}")
+    else:
+        typer.echo(f"Wrote {rendered} vouchers to {output_dir}")
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,160 @@
+"""Response compression and conditional-GET handling for the API.
+
+Compressible bodies (JSON, MessagePack, text) above a size threshold are
+compressed with brotli or gzip, depending on what the client accepts. Bodies
+that are already compressed, such as ZIP archives, PDFs and PNGs, pass
+through untouched and are never buffered. Successful GET responses get a weak
+ETag, and a matching If-None-Match is answered with 304 Not Modified.
+"""
+from typing import List, Optional
+import asyncio
+import gzip
+import hashlib
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+COMPRESSIBLE_MEDIA_TYPES = {
+    'application/json',
+    'application/msgpack',
+    'application/x-msgpack',
+    'text/html',
+    'text/plain',
+    'text/csv',
+}
+
+# Bodies larger than this are compressed in a worker thread instead of on the event loop
+OFFLOAD_COMPRESSION_SIZE = 256 * 1024
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """Pick the best content coding the client accepts"""
+    accepted = set()
+    for part in accept_encoding.lower().split(','):
+        coding, _, params = part.strip().partition(';')
+        quality = 1.0
+        for param in params.split(';'):
+            name, _, value = param.strip().partition('=')
+            if name == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if quality > 0:
+            accepted.add(coding.strip())
+    if brotli is not None and 'br' in accepted:
+        return 'br'
+    if 'gzip' in accepted or '*' in accepted:
+        return 'gzip'
+    return None
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against an ETag"""
+    if if_none_match.strip() == '*':
+        return True
+    bare = etag[2:] if etag.startswith('W/') else etag
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == bare:
+            return True
+    return False
+
+def compress_body(body: bytes, encoding: str, level: int) -> bytes:
+    """Compress a response body with the chosen content coding"""
+    if encoding == 'br':
+        return brotli.compress(body, quality=min(level, 11))
+    return gzip.compress(body, compresslevel=min(level, 9))
+
+class CompressionCachingMiddleware:
+    def __init__(self, app: ASGIApp, minimum_size: int = 1024, compress_level: int = 5):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.compress_level = compress_level
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        request_headers = Headers(scope=scope)
+        is_get = scope['method'] == 'GET'
+        encoding = choose_encoding(request_headers.get('accept-encoding', ''))
+        if_none_match = request_headers.get('if-none-match')
+
+        start_message: Optional[Message] = None
+        body_parts: List[bytes] = []
+        passthrough = False
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal start_message, passthrough
+
+            if message['type'] == 'http.response.start':
+                headers = Headers(raw=message['headers'])
+                media_type = headers.get('content-type', '').split(';')[0].strip().lower()
+                # Only buffer bodies we may compress or tag; everything else streams straight through
+                if media_type not in COMPRESSIBLE_MEDIA_TYPES or 'content-encoding' in headers:
+                    passthrough = True
+                    await send(message)
+                else:
+                    start_message = message
+                return
+
+            if passthrough or message['type'] != 'http.response.body':
+                await send(message)
+                return
+
+            body_parts.append(message.get('body', b''))
+            if message.get('more_body', False):
+                return
+
+            await self.finish(start_message, b''.join(body_parts), is_get, encoding, if_none_match, send)
+
+        await self.app(scope, receive, send_wrapper)
+
+    async def finish(
+        self,
+        start_message: Message,
+        body: bytes,
+        is_get: bool,
+        encoding: Optional[str],
+        if_none_match: Optional[str],
+        send: Send,
+    ) -> None:
+        headers = MutableHeaders(raw=start_message['headers'])
+        status = start_message['status']
+        # The body depends on Accept-Encoding whether or not this one gets compressed
+        headers.add_vary_header('Accept-Encoding')
+
+        if is_get and status == 200:
+            etag = headers.get('etag') or f'W/"{hashlib.sha256(body).hexdigest()[:32]}"'
+            headers['ETag'] = etag
+            if 'cache-control' not in headers:
+                # Clients may keep the response but must revalidate it each time
+                headers['Cache-Control'] = 'no-cache'
+            if if_none_match and etag_matches(if_none_match, etag):
+                not_modified = MutableHeaders()
+                for name in ('etag', 'cache-control', 'vary'):
+                    if name in headers:
+                        not_modified[name] = headers[name]
+                await send({'type': 'http.response.start', 'status': 304, 'headers': not_modified.raw})
+                await send({'type': 'http.response.body', 'body': b''})
+                return
+
+        if encoding and len(body) >= self.minimum_size:
+            if len(body) >= OFFLOAD_COMPRESSION_SIZE:
+                body = await asyncio.get_running_loop().run_in_executor(
+                    None, compress_body, body, encoding, self.compress_level
+                )
+            else:
+                body = compress_body(body, encoding, self.compress_level)
+            headers['Content-Encoding'] = encoding
+            headers['Content-Length'] = str(len(body))
+
+        await send(start_message)
+        await send({'type': 'http.response.body', 'body': body})
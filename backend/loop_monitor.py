@@ -0,0 +1,172 @@
+"""Event-loop lag measurement and blocking call-site capture.
+
+A heartbeat task on the event loop measures how late a short periodic sleep
+wakes up. A watchdog thread watches that heartbeat. When the loop has not
+ticked for longer than the threshold, the watchdog samples the loop thread's
+stack, so the call that is blocking is recorded while it still blocks. Each
+stall is logged with its call site and counted, and the counters are exported
+in Prometheus text format.
+"""
+from collections import Counter
+from pathlib import Path
+from types import FrameType
+from typing import List, Optional, Tuple
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+
+APP_DIR = Path(__file__).parent.resolve()
+
+# Reported instead of a call site when the loop thread was sampled inside its own idle wait.
+# The loop was not running our code; it was waiting for the GIL held by other threads.
+IDLE_SITE = "loop idle (GIL contention)"
+
+# Upper bounds (seconds) of the loop lag histogram buckets
+LAG_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+logger = logging.getLogger(__name__)
+
+def is_loop_idle(entry: traceback.FrameSummary) -> bool:
+    """Whether a frame is the event loop waiting for I/O rather than running a callback"""
+    name = Path(entry.filename).name
+    return name == 'selectors.py' or (name == 'base_events.py' and entry.name == '_run_once')
+
+def describe_call_site(frame: FrameType) -> Tuple[str, List[str]]:
+    """Name the innermost application frame of a stack and format the stack for logging"""
+    stack = traceback.extract_stack(frame)
+    if is_loop_idle(stack[-1]):
+        return IDLE_SITE, []
+    site = None
+    for entry in reversed(stack):
+        path = Path(entry.filename).resolve()
+        if path.parent == APP_DIR and path.name != Path(__file__).name:
+            site = f"{path.name}:{entry.lineno} in {entry.name}"
+            break
+    innermost = stack[-1]
+    blocking = f"{Path(innermost.filename).name}:{innermost.lineno} in {innermost.name}"
+    if site is None:
+        site = blocking
+    elif site != blocking:
+        site = f"{site} -> {blocking}"
+    return site, traceback.format_list(stack[-15:])
+
+class EventLoopMonitor:
+    def __init__(self, threshold: float = 0.1, interval: float = 0.02):
+        self.threshold = threshold
+        self.interval = interval
+        self.stalls = 0
+        self.stall_seconds = 0.0
+        self.max_lag = 0.0
+        self.last_lag = 0.0
+        self.sites: Counter = Counter()
+        self.lag_buckets = [0] * len(LAG_BUCKETS)
+        self.lag_count = 0
+        self.lag_sum = 0.0
+        self._heartbeat = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+        self._pending: Optional[Tuple[str, List[str]]] = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """Start monitoring the running event loop"""
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.get_running_loop().create_task(self._beat())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-monitor", daemon=True)
+        self._watchdog.start()
+        logger.info(f"Event loop monitor started (stall threshold {self.threshold * 1000:.0f} ms)")
+
+    async def stop(self) -> None:
+        """Stop the heartbeat task and the watchdog thread"""
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def _beat(self) -> None:
+        while True:
+            started = time.monotonic()
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self._heartbeat = now
+            self._record_lag(max(0.0, now - started - self.interval))
+
+    def _record_lag(self, lag: float) -> None:
+        self.last_lag = lag
+        self.max_lag = max(self.max_lag, lag)
+        self.lag_count += 1
+        self.lag_sum += lag
+        for i, bound in enumerate(LAG_BUCKETS):
+            if lag <= bound:
+                self.lag_buckets[i] += 1
+                break
+
+        if lag < self.threshold:
+            return
+        with self._lock:
+            pending, self._pending = self._pending, None
+        site, stack = pending or ("unknown (stall ended before it was sampled)", [])
+        self.stalls += 1
+        self.stall_seconds += lag
+        self.sites[site] += 1
+        logger.warning(
+            f"Event loop blocked for {lag * 1000:.0f} ms at {site}"
+            + (f"\n{''.join(stack)}" if stack else "")
+        )
+
+    def _watch(self) -> None:
+        sampled = False
+        while not self._stop.wait(self.interval):
+            blocked_for = time.monotonic() - self._heartbeat
+            if blocked_for < self.threshold:
+                sampled = False
+                continue
+            if sampled:
+                continue
+            # Sample once per stall, while the blocking call is still on the stack
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is not None:
+                with self._lock:
+                    self._pending = describe_call_site(frame)
+            sampled = True
+
+    def prometheus_metrics(self) -> str:
+        """Export the counters in Prometheus text exposition format"""
+        lines = [
+            "# HELP event_loop_stalls_total Event loop stalls longer than the threshold",
+            "# TYPE event_loop_stalls_total counter",
+            f"event_loop_stalls_total {self.stalls}",
+            "# HELP event_loop_stall_seconds_total Time spent in event loop stalls",
+            "# TYPE event_loop_stall_seconds_total counter",
+            f"event_loop_stall_seconds_total {self.stall_seconds:.6f}",
+            "# HELP event_loop_max_lag_seconds Largest event loop lag observed",
+            "# TYPE event_loop_max_lag_seconds gauge",
+            f"event_loop_max_lag_seconds {self.max_lag:.6f}",
+            "# HELP event_loop_lag_seconds Event loop lag per heartbeat",
+            "# TYPE event_loop_lag_seconds histogram",
+        ]
+        cumulative = 0
+        for bound, count in zip(LAG_BUCKETS, self.lag_buckets):
+            cumulative += count
+            lines.append(f'event_loop_lag_seconds_bucket{{le="{bound}"}} {cumulative}')
+        lines.extend([
+            f'event_loop_lag_seconds_bucket{{le="+Inf"}} {self.lag_count}',
+            f"event_loop_lag_seconds_sum {self.lag_sum:.6f}",
+            f"event_loop_lag_seconds_count {self.lag_count}",
+            "# HELP event_loop_stall_site_total Event loop stalls by blocking call site",
+            "# TYPE event_loop_stall_site_total counter",
+        ])
+        for site, count in self.sites.most_common():
+            escaped = site.replace('\\', '\\\\').replace('"', '\\"')
+            lines.append(f'event_loop_stall_site_total{{site="{escaped}"}} {count}')
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,170 @@
+"""Admission control and fair scheduling for voucher render work.
+
+Rendering is CPU-bound and runs outside the event loop. The scheduler caps
+how many renders run at once (global render slots), how many a single
+client may occupy, and how much work may be queued. Queued jobs are
+dispatched round-robin across clients, so one large batch cannot starve
+small requests from other agents.
+"""
+from collections import OrderedDict, deque
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional, Tuple
+import asyncio
+import math
+import time
+
+class RenderQueueFull(Exception):
+    """Raised when a batch cannot be admitted; carries a Retry-After estimate in seconds"""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+Job = Tuple[asyncio.Future, Callable[..., Any], Tuple[Any, ...]]
+
+class RenderScheduler:
+    def __init__(
+        self,
+        slots: int,
+        client_slots: int,
+        queue_limit: int,
+        client_queue_limit: int,
+        executor: Optional[Executor] = None,
+    ):
+        self.slots = slots
+        self.client_slots = client_slots
+        self.queue_limit = queue_limit
+        self.client_queue_limit = client_queue_limit
+        self._executor = executor or ThreadPoolExecutor(max_workers=slots, thread_name_prefix="render")
+        # Insertion order is the round-robin order; served clients move to the back
+        self._queues: "OrderedDict[str, Deque[Job]]" = OrderedDict()
+        self._running: Dict[str, int] = {}
+        self._outstanding: Dict[str, int] = {}
+        self._active = 0
+        # Exponentially weighted average render time, used for Retry-After
+        self._avg_job_seconds = 1.0
+
+    @property
+    def outstanding(self) -> int:
+        """Jobs queued or running across all clients"""
+        return sum(self._outstanding.values())
+
+    def retry_after(self) -> int:
+        """Estimate how long until the current backlog drains"""
+        return max(1, math.ceil(self.outstanding * self._avg_job_seconds / self.slots))
+
+    def reserve(self, client_id: str, count: int) -> None:
+        """Admit ``count`` jobs up front, to be submitted later with ``reserved=True``.
+
+        Chunked batches reserve their full size once, so a request never fails
+        half-way because the queue filled up behind it. Unused reservations
+        must be handed back with ``release``.
+        """
+        client_outstanding = self._outstanding.get(client_id, 0)
+        if client_outstanding + count > self.client_queue_limit:
+            raise RenderQueueFull(
+                f"Client render quota exceeded ({client_outstanding} vouchers pending, limit {self.client_queue_limit})",
+                self.retry_after(),
+            )
+        if self.outstanding + count > self.queue_limit:
+            raise RenderQueueFull(
+                f"Render queue is full ({self.outstanding} vouchers pending, limit {self.queue_limit})",
+                self.retry_after(),
+            )
+        if count:
+            self._outstanding[client_id] = client_outstanding + count
+
+    def release(self, client_id: str, count: int) -> None:
+        """Return reserved jobs that will never be submitted"""
+        for _ in range(count):
+            self._release(client_id, running=False)
+
+    def submit_batch(
+        self,
+        client_id: str,
+        func: Callable[..., Any],
+        args_list: Iterable[Tuple[Any, ...]],
+        reserved: bool = False,
+    ) -> List[asyncio.Future]:
+        """Admit a batch of jobs for a client and return one future per job.
+
+        The whole batch is admitted or rejected at once. Jobs covered by an
+        earlier ``reserve`` call pass ``reserved=True`` and skip admission.
+        """
+        args_list = list(args_list)
+        if not reserved:
+            self.reserve(client_id, len(args_list))
+
+        loop = asyncio.get_running_loop()
+        queue = self._queues.setdefault(client_id, deque())
+        futures = []
+        for args in args_list:
+            future = loop.create_future()
+            queue.append((future, func, args))
+            futures.append(future)
+        self._dispatch()
+        return futures
+
+    async def run(self, client_id: str, func: Callable[..., Any], *args: Any) -> Any:
+        """Admit and await a single job"""
+        (future,) = self.submit_batch(client_id, func, [args])
+        return await future
+
+    def _next_job(self) -> Optional[Tuple[str, Job]]:
+        for client_id in list(self._queues):
+            if self._running.get(client_id, 0) >= self.client_slots:
+                continue
+            queue = self._queues[client_id]
+            job = queue.popleft()
+            if queue:
+                self._queues.move_to_end(client_id)
+            else:
+                del self._queues[client_id]
+            return client_id, job
+        return None
+
+    def _dispatch(self) -> None:
+        loop = asyncio.get_running_loop()
+        while self._active < self.slots:
+            picked = self._next_job()
+            if picked is None:
+                return
+            client_id, (future, func, args) = picked
+            if future.cancelled():
+                # The request went away while its job was queued
+                self._release(client_id, running=False)
+                continue
+            self._active += 1
+            self._running[client_id] = self._running.get(client_id, 0) + 1
+            task = loop.run_in_executor(self._executor, _timed_call, func, args)
+            task.add_done_callback(lambda done, c=client_id, f=future: self._finished(c, f, done))
+
+    def _finished(self, client_id: str, future: asyncio.Future, done: asyncio.Future) -> None:
+        self._active -= 1
+        self._release(client_id, running=True)
+        if done.exception() is not None:
+            if not future.cancelled():
+                future.set_exception(done.exception())
+        else:
+            result, elapsed = done.result()
+            self._avg_job_seconds = 0.8 * self._avg_job_seconds + 0.2 * elapsed
+            if not future.cancelled():
+                future.set_result(result)
+        self._dispatch()
+
+    def _release(self, client_id: str, running: bool) -> None:
+        if running:
+            self._running[client_id] -= 1
+            if not self._running[client_id]:
+                del self._running[client_id]
+        self._outstanding[client_id] -= 1
+        if not self._outstanding[client_id]:
+            del self._outstanding[client_id]
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+def _timed_call(func: Callable[..., Any], args: Tuple[Any, ...]) -> Tuple[Any, float]:
+    started = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - started
@@ -0,0 +1,279 @@
+"""Shared PDF render service for multi-worker deployments.
+
+One long-lived process owns a pool of WeasyPrint render processes. All API
+workers send it HTML over a local Unix socket. The render processes stay
+warm, keeping fonts and WeasyPrint loaded, and every API worker shares one
+PDF cache.
+
+    python render_service.py --socket /tmp/voucher-render.sock --workers 4
+
+Wire protocol, one request at a time per connection:
+    request:  op byte + 4-byte big-endian length + payload
+    response: status byte + 4-byte length + result or error text
+
+    status 0 is success, 1 a failed render, 2 a service that cannot render
+    right now (the client treats it like an unreachable service)
+
+    b'P': payload is UTF-8 HTML, result is the PDF
+    b'S': empty payload, result is the cache statistics as JSON
+"""
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, Optional
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import socket
+import struct
+import threading
+
+import typer
+
+OP_RENDER_PDF = b'P'
+OP_STATS = b'S'
+STATUS_OK = 0
+STATUS_ERROR = 1
+STATUS_UNAVAILABLE = 2
+HEADER = struct.Struct('>I')
+
+logger = logging.getLogger(__name__)
+
+# Per render process: WeasyPrint and its font configuration are loaded once
+_font_config = None
+
+def _render_pdf(html_content: str) -> bytes:
+    global _font_config
+    import weasyprint
+    from weasyprint.text.fonts import FontConfiguration
+
+    if _font_config is None:
+        _font_config = FontConfiguration()
+    return weasyprint.HTML(string=html_content).write_pdf(font_config=_font_config)
+
+class PdfCache:
+    """LRU cache of rendered PDFs bounded by total size in bytes"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, bytes]" = OrderedDict()
+        self._size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[bytes]:
+        content = self._entries.get(key)
+        if content is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return content
+
+    def put(self, key: str, content: bytes) -> None:
+        if len(content) > self.max_bytes or key in self._entries:
+            return
+        self._entries[key] = content
+        self._size += len(content)
+        while self._size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._size -= len(evicted)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(self._entries),
+            "bytes": self._size,
+            "max_bytes": self.max_bytes,
+        }
+
+class RenderService:
+    def __init__(self, workers: int, cache_bytes: int):
+        self.workers = workers
+        self.executor = ProcessPoolExecutor(max_workers=workers)
+        self.cache = PdfCache(cache_bytes)
+        # Identical HTML already being rendered is awaited rather than rendered twice
+        self._in_flight: Dict[str, asyncio.Future] = {}
+
+    async def render_pdf(self, html_content: str) -> bytes:
+        """Render HTML to PDF on the pool, answering repeats from the shared cache"""
+        key = hashlib.sha256(html_content.encode()).hexdigest()
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        if key in self._in_flight:
+            return await asyncio.shield(self._in_flight[key])
+
+        future = asyncio.ensure_future(self._render_on_pool(html_content))
+        self._in_flight[key] = future
+        try:
+            content = await future
+        finally:
+            del self._in_flight[key]
+        self.cache.put(key, content)
+        return content
+
+    async def _render_on_pool(self, html_content: str) -> bytes:
+        for attempt in range(2):
+            executor = self.executor
+            try:
+                return await asyncio.get_running_loop().run_in_executor(executor, _render_pdf, html_content)
+            except BrokenProcessPool:
+                # A render process died (OOM kill, crash); a broken pool never recovers on its own
+                self._restart_pool(executor)
+                if attempt:
+                    raise
+
+    def _restart_pool(self, broken: ProcessPoolExecutor) -> None:
+        if self.executor is not broken:
+            # A concurrent render already replaced it
+            return
+        logger.warning("Render pool broke, starting a new one")
+        broken.shutdown(wait=False, cancel_futures=True)
+        self.executor = ProcessPoolExecutor(max_workers=self.workers)
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                try:
+                    op = await reader.readexactly(1)
+                    (length,) = HEADER.unpack(await reader.readexactly(HEADER.size))
+                    payload = await reader.readexactly(length)
+                except asyncio.IncompleteReadError:
+                    return
+
+                try:
+                    if op == OP_RENDER_PDF:
+                        status, result = STATUS_OK, await self.render_pdf(payload.decode('utf-8'))
+                    elif op == OP_STATS:
+                        stats = {**self.cache.stats(), "in_flight": len(self._in_flight)}
+                        status, result = STATUS_OK, json.dumps(stats).encode('utf-8')
+                    else:
+                        raise ValueError(f"Unknown render operation {op!r}")
+                except BrokenProcessPool as e:
+                    logger.error(f"Render pool unavailable: {str(e)}")
+                    status, result = STATUS_UNAVAILABLE, str(e).encode('utf-8')
+                except Exception as e:
+                    logger.error(f"Render failed: {str(e)}")
+                    status, result = STATUS_ERROR, str(e).encode('utf-8')
+
+                writer.write(bytes([status]) + HEADER.pack(len(result)) + result)
+                await writer.drain()
+        finally:
+            writer.close()
+
+    async def serve(self, socket_path: str) -> None:
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        server = await asyncio.start_unix_server(self.handle_connection, path=socket_path)
+        logger.info(f"Render service listening on {socket_path}")
+        async with server:
+            await server.serve_forever()
+
+class RenderServiceError(Exception):
+    """Raised when the render service reports a failed render"""
+
+class RenderServiceUnavailable(ConnectionError):
+    """Raised when the render service is up but cannot render; callers fall back like for any OSError"""
+
+class RenderServiceClient:
+    """Blocking client for the render service, one connection per calling thread"""
+
+    def __init__(self, socket_path: str, timeout: float = 120.0):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self) -> socket.socket:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            conn.settimeout(self.timeout)
+            conn.connect(self.socket_path)
+            self._local.conn = conn
+        return conn
+
+    def _close(self) -> None:
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def _recv_exactly(self, conn: socket.socket, size: int) -> bytes:
+        chunks = []
+        while size:
+            chunk = conn.recv(size)
+            if not chunk:
+                raise ConnectionError("Render service closed the connection")
+            chunks.append(chunk)
+            size -= len(chunk)
+        return b''.join(chunks)
+
+    def _request(self, op: bytes, payload: bytes) -> bytes:
+        try:
+            conn = self._connection()
+            conn.sendall(op + HEADER.pack(len(payload)) + payload)
+            status = self._recv_exactly(conn, 1)[0]
+            (length,) = HEADER.unpack(self._recv_exactly(conn, HEADER.size))
+            result = self._recv_exactly(conn, length)
+        except OSError:
+            # Drop the broken connection so the next call reconnects
+            self._close()
+            raise
+        if status == STATUS_UNAVAILABLE:
+            raise RenderServiceUnavailable(result.decode('utf-8', 'replace'))
+        if status != STATUS_OK:
+            raise RenderServiceError(result.decode('utf-8', 'replace'))
+        return result
+
+    def render_pdf(self, html_content: str) -> bytes:
+        """Render HTML to PDF in the service; OSError means the service is unreachable"""
+        return self._request(OP_RENDER_PDF, html_content.encode('utf-8'))
+
+    def stats(self) -> Dict[str, Any]:
+        """Fetch the shared PDF cache statistics"""
+        return json.loads(self._request(OP_STATS, b''))
+
+def prometheus_metrics(stats: Dict[str, Any]) -> str:
+    """Export render service statistics in Prometheus text exposition format"""
+    return "\n".join([
+        "# HELP render_cache_hits_total Renders answered from the shared PDF cache",
+        "# TYPE render_cache_hits_total counter",
+        f"render_cache_hits_total {stats['hits']}",
+        "# HELP render_cache_misses_total Renders not found in the shared PDF cache",
+        "# TYPE render_cache_misses_total counter",
+        f"render_cache_misses_total {stats['misses']}",
+        "# HELP render_cache_entries PDFs held in the shared cache",
+        "# TYPE render_cache_entries gauge",
+        f"render_cache_entries {stats['entries']}",
+        "# HELP render_cache_bytes Size of the PDFs held in the shared cache",
+        "# TYPE render_cache_bytes gauge",
+        f"render_cache_bytes {stats['bytes']}",
+        "# HELP render_in_flight Distinct renders currently running in the service",
+        "# TYPE render_in_flight gauge",
+        f"render_in_flight {stats['in_flight']}",
+    ]) + "\n"
+
+def main(
+    socket_path: str = typer.Option(
+        os.environ.get('RENDER_SERVICE_SOCKET', '/tmp/voucher-render.sock'), "--socket", help="Unix socket to listen on"
+    ),
+    workers: int = typer.Option(os.cpu_count() or 1, "--workers", "-w", min=1, help="Number of render processes"),
+    cache_mb: int = typer.Option(256, "--cache-mb", min=0, help="Shared PDF cache size in megabytes"),
+):
+    """Run the shared voucher render service"""
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    service = RenderService(workers=workers, cache_bytes=cache_mb * 1024 * 1024)
+    try:
+        asyncio.run(service.serve(socket_path))
+    finally:
+        service.executor.shutdown(cancel_futures=True)
+
+if __name__ == "__main__":
+    typer.run(main)
@@ -1,21 +1,40 @@
-from fastapi import FastAPI, APIRouter, UploadFile, File, HTTPException
-from fastapi.responses import FileResponse
+from fastapi import FastAPI, APIRouter, UploadFile, File, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
 import os
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field
-from typing import List, Dict, Any
+from pydantic import BaseModel, Field, field_validator
+from typing import List, Dict, Any, AsyncIterator, Optional, Tuple
 import uuid
 from datetime import datetime
-import pandas as pd
 import io
-import weasyprint
 from jinja2 import Template
-import tempfile
 import zipfile
+import asyncio
+import zlib
+import hashlib
+import json
+from collections import OrderedDict
+from http_middleware import CompressionCachingMiddleware
+from loop_monitor import EventLoopMonitor
+from render_scheduler import RenderScheduler, RenderQueueFull
+from render_service import RenderServiceError, prometheus_metrics as render_service_metrics
+from vouchers import (
+    MAPPED_FIELDS,
+    decode_vouchers,
+    html_to_pdf,
+    map_excel_data_to_template,
+    normalize_column_name,
+    parse_excel_workbook,
+    render_service_client,
+    render_voucher_pdf,
+    rows_to_columnar,
+    shutdown_sheet_pool,
+    voucher_template,
+)
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -45,226 +64,147 @@ class VoucherData(BaseModel):
     data: Dict[str, Any]
     generated_at: datetime = Field(default_factory=datetime.utcnow)
 
-# Voucher HTML Template
-VOUCHER_TEMPLATE = """
-<!DOCTYPE html>
-<html>
-<head>
-    <meta charset="utf-8">
-    <title>Hotel Booking Confirmation Voucher</title>
-    <style>
-        @page {
-            size: A4;
-            margin: 20mm;
-        }
-        
-        body {
-            font-family: Arial, sans-serif;
-            margin: 0;
-            padding: 0;
-            color: #333;
-        }
-        
-        .voucher-container {
-            border: 2px solid #dc2626;
-            padding: 20px;
-            background: white;
-        }
-        
-        .header {
-            text-align: center;
-            margin-bottom: 20px;
-        }
-        
-        .logo {
-            background: linear-gradient(135deg, #dc2626, #fbbf24);
-            color: white;
-            padding: 15px;
-            border-radius: 10px;
-            font-size: 24px;
-            font-weight: bold;
-            margin-bottom: 10px;
-        }
-        
-        .title {
-            color: #666;
-            font-size: 18px;
-            font-weight: bold;
-            margin: 15px 0;
-        }
-        
-        .emergency-contact {
-            background: #dc2626;
-            color: white;
-            padding: 15px;
-            margin: 20px 0;
-            border-radius: 5px;
-        }
-        
-        .emergency-title {
-            font-weight: bold;
-            font-size: 14px;
-            text-align: center;
-            margin-bottom: 8px;
-        }
-        
-        .emergency-text {
-            font-size: 12px;
-            text-align: center;
-            margin-bottom: 10px;
-        }
-        
-        .contact-info {
-            display: flex;
-            justify-content: space-between;
-            background: #fbbf24;
-            color: #000;
-            padding: 8px 15px;
-            border-radius: 3px;
-            font-weight: bold;
-            font-size: 12px;
-        }
-        
-        .voucher-details {
-            width: 100%;
-            border-collapse: collapse;
-            margin: 20px 0;
-        }
-        
-        .voucher-details td {
-            padding: 8px 12px;
-            border: 1px solid #ddd;
-            font-size: 12px;
-        }
-        
-        .label-cell {
-            background: #bfdbfe;
-            font-weight: bold;
-            width: 200px;
-            color: #1e40af;
-        }
-        
-        .value-cell {
-            background: #f8fafc;
-        }
-        
-        .map-link {
-            color: #2563eb;
-            text-decoration: underline;
-        }
-        
-        .cancellation-highlight {
-            color: #dc2626;
-            font-weight: bold;
-        }
-        
-        .footer-note {
-            margin-top: 30px;
-            padding: 15px;
-            background: #fef2f2;
-            border: 1px solid #fecaca;
-            border-radius: 5px;
-            color: #dc2626;
-            font-size: 12px;
-            text-align: center;
-            font-style: italic;
-        }
-    </style>
-</head>
-<body>
-    <div class="voucher-container">
-        <div class="header">
-            <div class="logo">LGT HOTEL STAYS</div>
-            <div class="title">PREPAID HOTEL CONFIRMATION VOUCHER</div>
-        </div>
-        
-        <div class="emergency-contact">
-            <div class="emergency-title">EMERGENCY CONTACT DETAILS (24/7 Support)</div>
-            <div class="emergency-text">In case of any issues during check-in/check-out during your stay at the hotel, please get in touch with us on our India emergency contact numbers mentioned below.</div>
-            <div class="contact-info">
-                <span>Mr. Sandeep +91 7326091303</span>
-                <span>Email: ops@lgthotelstays.com</span>
-            </div>
-        </div>
-        
-        <table class="voucher-details">
-            <tr>
-                <td class="label-cell">DATE VOUCHER ISSUED</td>
-                <td class="value-cell">{{ date_voucher_issued }}</td>
-            </tr>
-            <tr>
-                <td class="label-cell">CONFIRMATION NUMBER (S)</td>
-                <td class="value-cell">{{ confirmation_number }}</td>
-            </tr>
-            <tr>
-                <td class="label-cell">HOTEL NAME</td>
-                <td class="value-cell">{{ hotel_name }}</td>
-            </tr>
-            <tr>
-                <td class="label-cell">ADDRESS</td>
-                <td class="value-cell">{{ address }}</td>
-            </tr>
-            <tr>
-                <td class="label-cell">MAP LOCATION</td>
-                <td class="value-cell"><a href="{{ map_location }}" class="map-link">{{ map_location }}</a></td>
-            </tr>
-            <tr>
-                <td class="label-cell">HOTEL CONTACT NO.</td>
-                <td class="value-cell">{{ hotel_contact_no }}</td>
-            </tr>
-            <tr>
-                <td class="label-cell">LEAD PASSENGER NAME (S)</td>
-                <td class="value-cell">{{ lead_passenger_name }}</td>
-            </tr>
-            <tr>
-                <td class="label-cell">ROOM TYPE</td>
-                <td class="value-cell">{{ room_type }}</td>
-            </tr>
-            <tr>
-                <td class="label-cell">INCLUSIONS</td>
-                <td class="value-cell">{{ inclusions }}</td>
-            </tr>
-            <tr>
-                <td class="label-cell">NO OF ROOMS</td>
-                <td class="value-cell">{{ no_of_rooms }}</td>
-            </tr>
-            <tr>
-                <td class="label-cell">NO OF ADULTS</td>
-                <td class="value-cell">{{ no_of_adults }}</td>
-            </tr>
-            <tr>
-                <td class="label-cell">NO OF CHILDREN</td>
-                <td class="value-cell">{{ no_of_children }}</td>
-            </tr>
-            <tr>
-                <td class="label-cell">CHECK-IN DATE</td>
-                <td class="value-cell">{{ check_in_date }}</td>
-            </tr>
-            <tr>
-                <td class="label-cell">CHECK-OUT DATE</td>
-                <td class="value-cell">{{ check_out_date }}</td>
-            </tr>
-            <tr>
-                <td class="label-cell">DURATION</td>
-                <td class="value-cell">{{ duration }}</td>
-            </tr>
-            <tr>
-                <td class="label-cell">CANCELLATION POLICY</td>
-                <td class="value-cell cancellation-highlight">{{ cancellation_policy }}</td>
-            </tr>
-            <tr>
-                <td class="label-cell">BOOKED AND PAYABLE BY</td>
-                <td class="value-cell">{{ booked_and_payable_by }}</td>
-            </tr>
-        </table>
-        
-        <div class="footer-note">
-            This voucher is valid for the above specified services only. Any other extra service shall be paid by the client at the hotel.
-        </div>
-    </div>
-</body>
-</html>
-"""
+# Collections bulk generation may read from; anything else is rejected
+BOOKINGS_COLLECTION = os.environ.get('BOOKINGS_COLLECTION', 'bookings')
+BULK_IMPORT_COLLECTIONS = frozenset(
+    name.strip() for name in os.environ.get('BULK_IMPORT_COLLECTIONS', BOOKINGS_COLLECTION).split(',') if name.strip()
+)
+# Query operators that run server-side JavaScript and are never accepted in a bulk filter
+FORBIDDEN_FILTER_OPERATORS = frozenset({'$where', '$function', '$accumulator'})
+
+def find_forbidden_operator(value: Any) -> Optional[str]:
+    """Return the first JavaScript-executing operator found anywhere in a query filter"""
+    if isinstance(value, dict):
+        for key, nested in value.items():
+            if key in FORBIDDEN_FILTER_OPERATORS:
+                return key
+            found = find_forbidden_operator(nested)
+            if found:
+                return found
+    elif isinstance(value, list):
+        for nested in value:
+            found = find_forbidden_operator(nested)
+            if found:
+                return found
+    return None
+
+class BulkImportRequest(BaseModel):
+    collection: str = Field(default=BOOKINGS_COLLECTION)
+    filter: Dict[str, Any] = Field(default_factory=dict)
+    batch_size: int = Field(default=500, gt=0, le=10000)
+    limit: int = Field(default=0, ge=0)
+
+    @field_validator('collection')
+    @classmethod
+    def check_collection(cls, collection: str) -> str:
+        if collection not in BULK_IMPORT_COLLECTIONS:
+            raise ValueError(f"Collection must be one of: {', '.join(sorted(BULK_IMPORT_COLLECTIONS))}")
+        return collection
+
+    @field_validator('filter')
+    @classmethod
+    def check_filter(cls, filter: Dict[str, Any]) -> Dict[str, Any]:
+        operator = find_forbidden_operator(filter)
+        if operator:
+            raise ValueError(f"Filter operator {operator} is not allowed")
+        return filter
+
+# Render admission control: global slots, per-client slots and queue limits (in vouchers).
+# Every uvicorn worker has its own scheduler, so these are deployment-wide totals that are
+# split evenly across the API_WORKERS workers; set them for the whole deployment.
+API_WORKERS = max(1, int(os.environ.get('API_WORKERS', 1)))
+
+def per_worker(total: int) -> int:
+    """This worker's share of a deployment-wide limit"""
+    return max(1, total // API_WORKERS)
+
+render_scheduler = RenderScheduler(
+    slots=per_worker(int(os.environ.get('RENDER_SLOTS', os.cpu_count() or 1))),
+    client_slots=per_worker(int(os.environ.get('CLIENT_RENDER_SLOTS', max(1, (os.cpu_count() or 1) // 2)))),
+    queue_limit=per_worker(int(os.environ.get('RENDER_QUEUE_LIMIT', 20000))),
+    client_queue_limit=per_worker(int(os.environ.get('CLIENT_RENDER_QUEUE_LIMIT', 5000))),
+)
+
+class VoucherPreviewRequest(BaseModel):
+    data: Dict[str, Any]
+    format: str = Field(default="html", pattern=r'^(html|png)$')
+    scale: float = Field(default=0.75, gt=0, le=3)
+
+# API keys that get their own render quota; callers without a listed key are keyed by address
+API_KEYS = frozenset(key.strip() for key in os.environ.get('API_KEYS', '').split(',') if key.strip())
+
+# Event loop stall detection; stalls longer than the threshold are logged with their call site
+loop_monitor = EventLoopMonitor(
+    threshold=int(os.environ.get('LOOP_STALL_THRESHOLD_MS', 100)) / 1000,
+    interval=int(os.environ.get('LOOP_MONITOR_INTERVAL_MS', 20)) / 1000,
+)
+
+# Rendered previews keyed by row content hash, least recently used evicted first (total across workers)
+PREVIEW_CACHE_SIZE = per_worker(int(os.environ.get('PREVIEW_CACHE_SIZE', 256)))
+preview_cache: "OrderedDict[str, bytes]" = OrderedDict()
+
+# Bounds on a single generation request; larger batches must be split (or run through cli.py)
+MAX_BATCH_SIZE = int(os.environ.get('MAX_BATCH_SIZE', 5000))
+MAX_PAYLOAD_BYTES = int(os.environ.get('MAX_PAYLOAD_BYTES', 64 * 1024 * 1024))
+# Vouchers rendered and archived per step while streaming a batch
+GENERATION_CHUNK_SIZE = int(os.environ.get('GENERATION_CHUNK_SIZE', 25))
+
+# Content types accepted and produced for the binary voucher wire format
+MSGPACK_MEDIA_TYPES = ('application/msgpack', 'application/x-msgpack')
+
+def load_msgpack():
+    """Import msgpack on demand; it is only needed for the binary wire format"""
+    try:
+        import msgpack
+    except ImportError:
+        raise HTTPException(status_code=415, detail="MessagePack support requires the msgpack package")
+    return msgpack
+
+async def read_voucher_payload(request: Request) -> List[Dict[str, Any]]:
+    """Decode a voucher request body in any supported encoding and layout"""
+    too_large = HTTPException(
+        status_code=413, detail=f"Voucher payload exceeds {MAX_PAYLOAD_BYTES} bytes; split the batch"
+    )
+    body = bytearray()
+    async for chunk in request.stream():
+        body.extend(chunk)
+        if len(body) > MAX_PAYLOAD_BYTES:
+            raise too_large
+    body = bytes(body)
+    
+    content_encoding = request.headers.get('content-encoding', '').lower()
+    try:
+        if content_encoding == 'gzip':
+            # Bounded decompression so a small compressed body cannot expand without limit
+            body = zlib.decompressobj(wbits=16 + zlib.MAX_WBITS).decompress(body, MAX_PAYLOAD_BYTES + 1)
+        elif content_encoding == 'br':
+            import brotli
+            decompressor = brotli.Decompressor()
+            body = decompressor.process(body, output_buffer_limit=MAX_PAYLOAD_BYTES + 1)
+            if len(body) <= MAX_PAYLOAD_BYTES and not decompressor.is_finished():
+                raise ValueError("Truncated brotli body")
+        elif content_encoding not in ('', 'identity'):
+            raise HTTPException(status_code=415, detail=f"Unsupported Content-Encoding: {content_encoding}")
+        if len(body) > MAX_PAYLOAD_BYTES:
+            raise too_large
+        
+        if request.headers.get('content-type', '').startswith(MSGPACK_MEDIA_TYPES):
+            payload = load_msgpack().unpackb(body)
+        else:
+            payload = json.loads(body)
+        return decode_vouchers(payload)
+    except HTTPException:
+        raise
+    except ImportError:
+        raise HTTPException(status_code=415, detail="Brotli request bodies require the brotli package")
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Invalid voucher payload: {str(e)}")
+
+def encode_payload(request: Request, payload: Dict[str, Any]) -> Response:
+    """Serialize a response as MessagePack when the client accepts it, JSON otherwise"""
+    if any(media_type in request.headers.get('accept', '') for media_type in MSGPACK_MEDIA_TYPES):
+        return Response(content=load_msgpack().packb(payload), media_type='application/msgpack')
+    return JSONResponse(content=payload)
 
 # Add your routes to the router instead of directly to app
 @api_router.get("/")
@@ -272,8 +212,18 @@ async def root():
     return {"message": "Hotel Voucher Generator API"}
 
 @api_router.post("/upload-excel")
-async def upload_excel_file(file: UploadFile = File(...)):
-    """Upload and parse Excel file containing voucher data"""
+async def upload_excel_file(
+    request: Request,
+    file: UploadFile = File(...),
+    sheets: Optional[str] = None,
+    layout: str = Query("rows", pattern=r'^(rows|columnar)$')
+):
+    """Upload and parse Excel file containing voucher data.
+
+    All sheets are parsed unless ``sheets`` names a comma-separated subset.
+    Each row is tagged with the sheet it came from. ``layout=columnar``
+    returns the vouchers as column arrays instead of one dict per row.
+    """
     try:
         # Validate file type
         if not file.filename.endswith(('.xlsx', '.xls')):
@@ -281,135 +231,359 @@ async def upload_excel_file(file: UploadFile = File(...)):
         
         # Read the Excel file
         contents = await file.read()
-        df = pd.read_excel(io.BytesIO(contents))
-        
-        # Convert DataFrame to list of dictionaries
-        voucher_data = df.to_dict('records')
+        selected_sheets = [name.strip() for name in sheets.split(',') if name.strip()] if sheets else None
+        parsed_sheets = await asyncio.get_running_loop().run_in_executor(
+            None, parse_excel_workbook, contents, selected_sheets
+        )
         
-        # Clean and validate data
+        # Merge rows from every sheet, keeping a global row number
         processed_vouchers = []
-        for i, row in enumerate(voucher_data):
-            # Convert all values to strings and handle NaN values
-            cleaned_row = {}
-            for key, value in row.items():
-                # Normalize key: lowercase, replace spaces and hyphens with underscores
-                normalized_key = str(key).lower().replace(' ', '_').replace('-', '_')
-                if pd.isna(value):
-                    cleaned_row[normalized_key] = ""
-                else:
-                    cleaned_row[normalized_key] = str(value)
-            
-            processed_vouchers.append({
-                "row_number": i + 1,
-                "data": cleaned_row
-            })
-        
-        return {
+        columns = []
+        for sheet in parsed_sheets:
+            for row in sheet["rows"]:
+                processed_vouchers.append({
+                    "row_number": len(processed_vouchers) + 1,
+                    "source_sheet": sheet["name"],
+                    "data": row
+                })
+            columns.extend(c for c in sheet["columns"] if c not in columns)
+        
+        return encode_payload(request, {
             "status": "success",
-            "message": f"Successfully parsed {len(processed_vouchers)} voucher records",
-            "vouchers": processed_vouchers,
-            "columns": list(df.columns)
-        }
-        
+            "message": f"Successfully parsed {len(processed_vouchers)} voucher records from {len(parsed_sheets)} sheet(s)",
+            "vouchers": rows_to_columnar(processed_vouchers) if layout == "columnar" else processed_vouchers,
+            "columns": columns,
+            "sheets": [
+                {
+                    "name": sheet["name"],
+                    "row_count": len(sheet["rows"]),
+                    "columns": sheet["columns"],
+                    "column_mapping": sheet["column_mapping"]
+                }
+                for sheet in parsed_sheets
+            ]
+        })
+        
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error processing Excel file: {str(e)}")
         raise HTTPException(status_code=400, detail=f"Error processing Excel file: {str(e)}")
 
-@api_router.post("/generate-vouchers")
-async def generate_vouchers(vouchers: List[Dict[str, Any]]):
-    """Generate PDF vouchers from voucher data"""
+def client_identity(request: Request) -> str:
+    """Identify the caller for render quotas: a configured API key first, then the address nginx saw"""
+    api_key = request.headers.get('x-api-key')
+    if api_key and api_key in API_KEYS:
+        return f"key:{api_key}"
+    # nginx sets X-Real-IP and appends the peer address last to X-Forwarded-For; earlier hops are client-supplied
+    real_ip = request.headers.get('x-real-ip')
+    if real_ip:
+        return f"ip:{real_ip.strip()}"
+    forwarded_for = request.headers.get('x-forwarded-for')
+    if forwarded_for:
+        return f"ip:{forwarded_for.split(',')[-1].strip()}"
+    return f"ip:{request.client.host if request.client else 'unknown'}"
+
+def queue_full_error(error: RenderQueueFull) -> HTTPException:
+    """Translate a rejected render batch into a 429 with Retry-After"""
+    logger.warning(f"Render batch rejected: {error}")
+    return HTTPException(
+        status_code=429,
+        detail=str(error),
+        headers={"Retry-After": str(error.retry_after)}
+    )
+
+class ZipStreamBuffer(io.RawIOBase):
+    """Unseekable sink that lets zipfile stream an archive out in pieces"""
+    
+    def __init__(self):
+        super().__init__()
+        self._chunks: List[bytes] = []
+    
+    def writable(self) -> bool:
+        return True
+    
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+    
+    def drain(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+async def render_voucher_chunks(
+    vouchers: List[Dict[str, Any]], client_id: str
+) -> AsyncIterator[List[Tuple[str, bytes]]]:
+    """Render vouchers GENERATION_CHUNK_SIZE at a time against a prior scheduler reservation.
+
+    The next chunk is only submitted once the consumer asks for it, so a slow
+    download holds rendering back instead of piling PDFs up in memory.
+    """
+    template = voucher_template()
+    submitted = 0
     try:
-        # Create temporary directory for PDFs
-        temp_dir = tempfile.mkdtemp()
-        pdf_files = []
-        
-        template = Template(VOUCHER_TEMPLATE)
-        
-        for i, voucher_data in enumerate(vouchers):
-            # Map Excel column names to template variables
-            template_data = map_excel_data_to_template(voucher_data.get('data', {}))
-            
-            # Render HTML
-            html_content = template.render(**template_data)
-            
-            # Generate PDF
-            pdf_filename = f"voucher_{i+1}_{template_data.get('confirmation_number', 'unknown')}.pdf"
-            pdf_path = os.path.join(temp_dir, pdf_filename)
-            
-            weasyprint.HTML(string=html_content).write_pdf(pdf_path)
-            pdf_files.append(pdf_path)
-        
-        # Create ZIP file containing all PDFs
-        zip_filename = f"hotel_vouchers_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"
-        zip_path = os.path.join(temp_dir, zip_filename)
-        
-        with zipfile.ZipFile(zip_path, 'w') as zipf:
-            for pdf_file in pdf_files:
-                zipf.write(pdf_file, os.path.basename(pdf_file))
-        
-        return FileResponse(
-            path=zip_path,
-            filename=zip_filename,
-            media_type='application/zip',
-            headers={
-                "Content-Disposition": f"attachment; filename={zip_filename}",
-                "Access-Control-Expose-Headers": "Content-Disposition"
-            }
+        for start in range(0, len(vouchers), GENERATION_CHUNK_SIZE):
+            chunk = vouchers[start:start + GENERATION_CHUNK_SIZE]
+            futures = render_scheduler.submit_batch(
+                client_id,
+                render_voucher_pdf,
+                [(template, voucher_data.get('data', {}), start + i + 1) for i, voucher_data in enumerate(chunk)],
+                reserved=True
+            )
+            submitted += len(chunk)
+            yield await asyncio.gather(*futures)
+    finally:
+        # Hand back the reservation for chunks that were never submitted
+        render_scheduler.release(client_id, len(vouchers) - submitted)
+
+async def stream_voucher_zip(
+    first_chunk: List[Tuple[str, bytes]], chunks: AsyncIterator[List[Tuple[str, bytes]]]
+) -> AsyncIterator[bytes]:
+    """Stream a ZIP archive, writing each chunk of PDFs as soon as it is rendered"""
+    buffer = ZipStreamBuffer()
+    with zipfile.ZipFile(buffer, 'w') as zipf:
+        pdfs = first_chunk
+        while True:
+            for pdf_filename, pdf_content in pdfs:
+                zipf.writestr(pdf_filename, pdf_content)
+            yield buffer.drain()
+            try:
+                pdfs = await chunks.__anext__()
+            except StopAsyncIteration:
+                break
+    # Central directory, written when the archive is closed
+    yield buffer.drain()
+
+def zip_stream_response(
+    first_chunk: List[Tuple[str, bytes]], chunks: AsyncIterator[List[Tuple[str, bytes]]]
+) -> StreamingResponse:
+    """Build the download response for a voucher archive streamed as it is rendered"""
+    zip_filename = f"hotel_vouchers_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"
+    return StreamingResponse(
+        stream_voucher_zip(first_chunk, chunks),
+        media_type='application/zip',
+        headers={
+            "Content-Disposition": f"attachment; filename={zip_filename}",
+            "Access-Control-Expose-Headers": "Content-Disposition"
+        }
+    )
+
+@api_router.post("/generate-vouchers")
+async def generate_vouchers(request: Request):
+    """Generate PDF vouchers from voucher data.
+
+    The body is a list of row vouchers or a columnar payload, as JSON or
+    MessagePack, optionally gzip or brotli compressed. Vouchers are rendered
+    in bounded chunks and the ZIP is streamed as it is built, so memory use
+    does not grow with the batch size.
+    """
+    vouchers = await read_voucher_payload(request)
+    # A batch beyond this worker's client quota could never be admitted, so reject it as too large
+    batch_limit = min(MAX_BATCH_SIZE, render_scheduler.client_queue_limit)
+    if len(vouchers) > batch_limit:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch of {len(vouchers)} vouchers exceeds the limit of {batch_limit}; split it into smaller batches"
         )
-        
+    
+    client_id = client_identity(request)
+    try:
+        # Admit the whole batch once; chunks then draw from this reservation
+        render_scheduler.reserve(client_id, len(vouchers))
+    except RenderQueueFull as e:
+        raise queue_full_error(e)
+    
+    chunks = render_voucher_chunks(vouchers, client_id)
+    try:
+        # Render the first chunk before responding so early failures still return an error status
+        first_chunk = await chunks.__anext__() if vouchers else []
     except Exception as e:
+        await chunks.aclose()
         logger.error(f"Error generating vouchers: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error generating vouchers: {str(e)}")
+    
+    return zip_stream_response(first_chunk, chunks)
 
-def map_excel_data_to_template(data: Dict[str, Any]) -> Dict[str, str]:
-    """Map Excel column data to template variables with fallbacks"""
+def clean_db_record(record: Dict[str, Any]) -> Dict[str, str]:
+    """Normalize a MongoDB booking document the same way as an Excel row, keeping only mapped fields"""
+    cleaned = {}
+    for key, value in record.items():
+        normalized_key = normalize_column_name(key)
+        if normalized_key in MAPPED_FIELDS:
+            cleaned[normalized_key] = "" if value is None else str(value)
+    return cleaned
+
+async def iter_booking_records(import_request: BulkImportRequest) -> AsyncIterator[Dict[str, str]]:
+    """Stream booking records from MongoDB in cursor batches"""
+    # Documents may be keyed like spreadsheet headers ("Guest Name"), so fields are matched
+    # after normalization; a projection on normalized names would drop them
+    cursor = db[import_request.collection].find(
+        import_request.filter, {'_id': 0}, batch_size=import_request.batch_size
+    )
+    if import_request.limit:
+        cursor = cursor.limit(import_request.limit)
+    async for record in cursor:
+        yield clean_db_record(record)
+
+async def reserve_when_available(client_id: str, count: int) -> None:
+    """Reserve render jobs for an archive that is already streaming, waiting for room instead of failing"""
+    while True:
+        try:
+            render_scheduler.reserve(client_id, count)
+            return
+        except RenderQueueFull as e:
+            await asyncio.sleep(min(e.retry_after, 5))
+
+async def render_record_chunks(
+    import_request: BulkImportRequest, client_id: str
+) -> AsyncIterator[List[Tuple[str, bytes]]]:
+    """Render booking records GENERATION_CHUNK_SIZE at a time as the cursor yields them.
+
+    The first chunk is admitted like any request and may be rejected with a
+    429. Later chunks wait for queue room, since by then the archive is
+    already being sent and failing it half-way would truncate the download.
+    """
+    template = voucher_template()
+    count = 0
+    chunk: List[Tuple[Template, Dict[str, str], int]] = []
     
-    # Common mapping variations for Excel columns
-    mapping = {
-        'date_voucher_issued': ['date_voucher_issued', 'voucher_date', 'issue_date', 'created_date'],
-        'confirmation_number': ['confirmation_number', 'booking_id', 'confirmation_id', 'booking_number'],
-        'hotel_name': ['hotel_name', 'hotel', 'property_name'],
-        'address': ['address', 'hotel_address', 'location'],
-        'map_location': ['map_location', 'map_link', 'google_maps', 'location_link'],
-        'hotel_contact_no': ['hotel_contact_no', 'hotel_phone', 'contact_number', 'phone'],
-        'lead_passenger_name': ['lead_passenger_name', 'guest_name', 'primary_guest', 'name'],
-        'room_type': ['room_type', 'room_category', 'accommodation_type'],
-        'inclusions': ['inclusions', 'amenities', 'services_included'],
-        'no_of_rooms': ['no_of_rooms', 'rooms', 'room_count'],
-        'no_of_adults': ['no_of_adults', 'adults', 'adult_count'],
-        'no_of_children': ['no_of_children', 'children', 'child_count', 'kids'],
-        'check_in_date': ['check_in_date', 'checkin_date', 'arrival_date', 'check_in'],
-        'check_out_date': ['check_out_date', 'checkout_date', 'departure_date', 'check_out'],
-        'duration': ['duration', 'nights', 'stay_duration', 'number_of_nights'],
-        'cancellation_policy': ['cancellation_policy', 'cancellation', 'policy'],
-        'booked_and_payable_by': ['booked_and_payable_by', 'booked_by', 'agency', 'company']
-    }
+    async def render_chunk(first: bool) -> List[Tuple[str, bytes]]:
+        if first:
+            render_scheduler.reserve(client_id, len(chunk))
+        else:
+            await reserve_when_available(client_id, len(chunk))
+        futures = render_scheduler.submit_batch(client_id, render_voucher_pdf, chunk, reserved=True)
+        chunk.clear()
+        return await asyncio.gather(*futures)
+    
+    async for record in iter_booking_records(import_request):
+        count += 1
+        chunk.append((template, record, count))
+        if len(chunk) >= GENERATION_CHUNK_SIZE:
+            yield await render_chunk(first=count == len(chunk))
+    if chunk:
+        yield await render_chunk(first=count == len(chunk))
+
+@api_router.post("/generate-vouchers/from-db")
+async def generate_vouchers_from_db(import_request: BulkImportRequest, request: Request):
+    """Generate PDF vouchers directly from booking records stored in MongoDB.
+
+    Records are read in cursor batches, rendered a chunk at a time and the
+    ZIP is streamed as it is built, so memory stays bounded regardless of
+    how many bookings match.
+    """
+    chunks = render_record_chunks(import_request, client_identity(request))
+    try:
+        # Render the first chunk before responding so early failures still return an error status
+        first_chunk = await chunks.__anext__()
+    except StopAsyncIteration:
+        raise HTTPException(status_code=404, detail="No booking records matched the filter")
+    except RenderQueueFull as e:
+        await chunks.aclose()
+        raise queue_full_error(e)
+    except Exception as e:
+        await chunks.aclose()
+        logger.error(f"Error generating vouchers from database: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error generating vouchers: {str(e)}")
     
-    result = {}
+    logger.info(f"Streaming vouchers from collection '{import_request.collection}'")
+    return zip_stream_response(first_chunk, chunks)
+
+def rasterize_pdf_page(pdf_content: bytes, scale: float) -> bytes:
+    """Rasterize the first page of a PDF to PNG (1.0 scale is 72 dpi)"""
+    try:
+        import pypdfium2 as pdfium
+    except ImportError:
+        raise HTTPException(status_code=501, detail="PNG previews require the pypdfium2 package")
     
-    for template_key, possible_columns in mapping.items():
-        value = ""
-        for col in possible_columns:
-            if col in data and data[col]:
-                value = str(data[col]).strip()
-                break
-        
-        # Set default values for missing data
-        if not value:
-            if template_key == 'date_voucher_issued':
-                value = datetime.now().strftime('%d-%b-%Y')
-            elif template_key == 'booked_and_payable_by':
-                value = 'LGT India'
-            elif template_key == 'map_location':
-                value = '#'
-            elif template_key in ['no_of_children', 'no_of_rooms', 'no_of_adults']:
-                value = '0'
+    document = pdfium.PdfDocument(pdf_content)
+    try:
+        image = document[0].render(scale=scale).to_pil()
+        buffer = io.BytesIO()
+        image.save(buffer, format='PNG', optimize=True)
+        return buffer.getvalue()
+    finally:
+        document.close()
+
+def render_voucher_png(html_content: str, scale: float) -> bytes:
+    """Render voucher HTML to a PDF and rasterize its first page"""
+    return rasterize_pdf_page(html_to_pdf(html_content), scale)
+
+def preview_cache_get(key: str) -> Optional[bytes]:
+    """Look up a cached preview, marking it most recently used"""
+    content = preview_cache.get(key)
+    if content is not None:
+        preview_cache.move_to_end(key)
+    return content
+
+def preview_cache_put(key: str, content: bytes) -> None:
+    """Store a preview, evicting the least recently used beyond PREVIEW_CACHE_SIZE"""
+    preview_cache[key] = content
+    preview_cache.move_to_end(key)
+    while len(preview_cache) > PREVIEW_CACHE_SIZE:
+        preview_cache.popitem(last=False)
+
+@api_router.post("/vouchers/preview")
+async def preview_voucher(preview: VoucherPreviewRequest, request: Request):
+    """Render a single voucher row as HTML or a low-resolution PNG of the page.
+
+    Previews are cached by a hash of the mapped row content, so checking the
+    same rows again before a batch costs nothing.
+    """
+    try:
+        template_data = map_excel_data_to_template(preview.data)
+        content_hash = hashlib.sha256(
+            json.dumps([template_data, preview.format, preview.scale], sort_keys=True).encode()
+        ).hexdigest()
+        
+        content = preview_cache_get(content_hash)
+        cache_status = "hit" if content is not None else "miss"
+        if content is None:
+            html_content = voucher_template().render(**template_data)
+            if preview.format == "html":
+                content = html_content.encode()
             else:
-                value = 'N/A'
+                content = await render_scheduler.run(
+                    client_identity(request), render_voucher_png, html_content, preview.scale
+                )
+            preview_cache_put(content_hash, content)
+        
+        return Response(
+            content=content,
+            media_type="text/html; charset=utf-8" if preview.format == "html" else "image/png",
+            headers={
+                "ETag": f'"{content_hash}"',
+                # Previews are never meant to run script, even if opened directly
+                "Content-Security-Policy": "sandbox",
+                "X-Preview-Cache": cache_status,
+                "Access-Control-Expose-Headers": "X-Preview-Cache"
+            }
+        )
         
-        result[template_key] = value
-    
-    return result
+    except HTTPException:
+        raise
+    except RenderQueueFull as e:
+        raise queue_full_error(e)
+    except Exception as e:
+        logger.error(f"Error rendering voucher preview: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error rendering voucher preview: {str(e)}")
+
+@api_router.get("/metrics")
+async def get_metrics():
+    """Event loop and shared render service metrics in Prometheus text format"""
+    metrics = loop_monitor.prometheus_metrics()
+    if render_service_client is not None:
+        try:
+            stats = await asyncio.get_running_loop().run_in_executor(None, render_service_client.stats)
+            metrics += render_service_metrics(stats)
+        except (OSError, RenderServiceError) as e:
+            logger.warning(f"Render service metrics unavailable: {str(e)}")
+    return PlainTextResponse(
+        metrics,
+        media_type="text/plain; version=0.0.4; charset=utf-8",
+        headers={"Cache-Control": "no-store"}
+    )
 
 @api_router.post("/status", response_model=StatusCheck)
 async def create_status_check(input: StatusCheckCreate):
@@ -426,6 +600,12 @@ async def get_status_checks():
 # Include the router in the main app
 app.include_router(api_router)
 
+app.add_middleware(
+    CompressionCachingMiddleware,
+    minimum_size=int(os.environ.get('COMPRESSION_MIN_SIZE', 1024)),
+    compress_level=int(os.environ.get('COMPRESSION_LEVEL', 5)),
+)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -441,6 +621,14 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def start_loop_monitor():
+    if os.environ.get('LOOP_MONITOR_ENABLED', 'true').lower() != 'false':
+        loop_monitor.start()
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
     client.close()
+    render_scheduler.shutdown()
+    shutdown_sheet_pool()
+    await loop_monitor.stop()
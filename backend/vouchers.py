@@ -0,0 +1,514 @@
+"""Voucher data handling and rendering shared by the API server and the CLI.
+
+Workbook parsing, the row and columnar payload formats, the mapping of
+source columns onto the voucher template, and PDF rendering live here. The
+module has no import-time side effects beyond reading configuration, so
+cli.py can use it without a database or a web app.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import io
+import logging
+import multiprocessing
+import os
+import re
+import threading
+
+import pandas as pd
+from jinja2 import Environment, Template
+
+from render_service import RenderServiceClient
+
+logger = logging.getLogger(__name__)
+
+# Shared render service used by all API workers (see render_service.py); renders in-process when unset
+render_service_client = (
+    RenderServiceClient(os.environ['RENDER_SERVICE_SOCKET']) if os.environ.get('RENDER_SERVICE_SOCKET') else None
+)
+
+# Processes used to parse the sheets of large multi-sheet workbooks side by side
+SHEET_PARSE_WORKERS = int(os.environ.get('SHEET_PARSE_WORKERS', min(4, os.cpu_count() or 1)))
+# Smaller workbooks parse faster in one pass than the pool round trip costs
+SHEET_PARSE_PARALLEL_MIN_BYTES = int(os.environ.get('SHEET_PARSE_PARALLEL_MIN_BYTES', 2 * 1024 * 1024))
+
+_sheet_pool: Optional[ProcessPoolExecutor] = None
+_sheet_pool_lock = threading.Lock()
+
+# Common mapping variations for Excel columns
+COLUMN_MAPPING = {
+    'date_voucher_issued': ['date_voucher_issued', 'voucher_date', 'issue_date', 'created_date'],
+    'confirmation_number': ['confirmation_number', 'booking_id', 'confirmation_id', 'booking_number'],
+    'hotel_name': ['hotel_name', 'hotel', 'property_name'],
+    'address': ['address', 'hotel_address', 'location'],
+    'map_location': ['map_location', 'map_link', 'google_maps', 'location_link'],
+    'hotel_contact_no': ['hotel_contact_no', 'hotel_phone', 'contact_number', 'phone'],
+    'lead_passenger_name': ['lead_passenger_name', 'guest_name', 'primary_guest', 'name'],
+    'room_type': ['room_type', 'room_category', 'accommodation_type'],
+    'inclusions': ['inclusions', 'amenities', 'services_included'],
+    'no_of_rooms': ['no_of_rooms', 'rooms', 'room_count'],
+    'no_of_adults': ['no_of_adults', 'adults', 'adult_count'],
+    'no_of_children': ['no_of_children', 'children', 'child_count', 'kids'],
+    'check_in_date': ['check_in_date', 'checkin_date', 'arrival_date', 'check_in'],
+    'check_out_date': ['check_out_date', 'checkout_date', 'departure_date', 'check_out'],
+    'duration': ['duration', 'nights', 'stay_duration', 'number_of_nights'],
+    'cancellation_policy': ['cancellation_policy', 'cancellation', 'policy'],
+    'booked_and_payable_by': ['booked_and_payable_by', 'booked_by', 'agency', 'company']
+}
+
+# Every normalized source column the template mapping can use
+MAPPED_FIELDS = frozenset(column for columns in COLUMN_MAPPING.values() for column in columns)
+
+# Link schemes that can run script and are never used as a voucher's map link
+UNSAFE_LINK_SCHEMES = ('javascript:', 'data:', 'vbscript:')
+
+# Voucher HTML Template
+VOUCHER_TEMPLATE = """
+<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="utf-8">
+    <title>Hotel Booking Confirmation Voucher</title>
+    <style>
+        @page {
+            size: A4;
+            margin: 20mm;
+        }
+        
+        body {
+            font-family: Arial, sans-serif;
+            margin: 0;
+            padding: 0;
+            color: #333;
+        }
+        
+        .voucher-container {
+            border: 2px solid #dc2626;
+            padding: 20px;
+            background: white;
+        }
+        
+        .header {
+            text-align: center;
+            margin-bottom: 20px;
+        }
+        
+        .logo {
+            background: linear-gradient(135deg, #dc2626, #fbbf24);
+            color: white;
+            padding: 15px;
+            border-radius: 10px;
+            font-size: 24px;
+            font-weight: bold;
+            margin-bottom: 10px;
+        }
+        
+        .title {
+            color: #666;
+            font-size: 18px;
+            font-weight: bold;
+            margin: 15px 0;
+        }
+        
+        .emergency-contact {
+            background: #dc2626;
+            color: white;
+            padding: 15px;
+            margin: 20px 0;
+            border-radius: 5px;
+        }
+        
+        .emergency-title {
+            font-weight: bold;
+            font-size: 14px;
+            text-align: center;
+            margin-bottom: 8px;
+        }
+        
+        .emergency-text {
+            font-size: 12px;
+            text-align: center;
+            margin-bottom: 10px;
+        }
+        
+        .contact-info {
+            display: flex;
+            justify-content: space-between;
+            background: #fbbf24;
+            color: #000;
+            padding: 8px 15px;
+            border-radius: 3px;
+            font-weight: bold;
+            font-size: 12px;
+        }
+        
+        .voucher-details {
+            width: 100%;
+            border-collapse: collapse;
+            margin: 20px 0;
+        }
+        
+        .voucher-details td {
+            padding: 8px 12px;
+            border: 1px solid #ddd;
+            font-size: 12px;
+        }
+        
+        .label-cell {
+            background: #bfdbfe;
+            font-weight: bold;
+            width: 200px;
+            color: #1e40af;
+        }
+        
+        .value-cell {
+            background: #f8fafc;
+        }
+        
+        .map-link {
+            color: #2563eb;
+            text-decoration: underline;
+        }
+        
+        .cancellation-highlight {
+            color: #dc2626;
+            font-weight: bold;
+        }
+        
+        .footer-note {
+            margin-top: 30px;
+            padding: 15px;
+            background: #fef2f2;
+            border: 1px solid #fecaca;
+            border-radius: 5px;
+            color: #dc2626;
+            font-size: 12px;
+            text-align: center;
+            font-style: italic;
+        }
+    </style>
+</head>
+<body>
+    <div class="voucher-container">
+        <div class="header">
+            <div class="logo">LGT HOTEL STAYS</div>
+            <div class="title">PREPAID HOTEL CONFIRMATION VOUCHER</div>
+        </div>
+        
+        <div class="emergency-contact">
+            <div class="emergency-title">EMERGENCY CONTACT DETAILS (24/7 Support)</div>
+            <div class="emergency-text">In case of any issues during check-in/check-out during your stay at the hotel, please get in touch with us on our India emergency contact numbers mentioned below.</div>
+            <div class="contact-info">
+                <span>Mr. Sandeep +91 7326091303</span>
+                <span>Email: ops@lgthotelstays.com</span>
+            </div>
+        </div>
+        
+        <table class="voucher-details">
+            <tr>
+                <td class="label-cell">DATE VOUCHER ISSUED</td>
+                <td class="value-cell">{{ date_voucher_issued }}</td>
+            </tr>
+            <tr>
+                <td class="label-cell">CONFIRMATION NUMBER (S)</td>
+                <td class="value-cell">{{ confirmation_number }}</td>
+            </tr>
+            <tr>
+                <td class="label-cell">HOTEL NAME</td>
+                <td class="value-cell">{{ hotel_name }}</td>
+            </tr>
+            <tr>
+                <td class="label-cell">ADDRESS</td>
+                <td class="value-cell">{{ address }}</td>
+            </tr>
+            <tr>
+                <td class="label-cell">MAP LOCATION</td>
+                <td class="value-cell"><a href="{{ map_url }}" class="map-link">{{ map_location }}</a></td>
+            </tr>
+            <tr>
+                <td class="label-cell">HOTEL CONTACT NO.</td>
+                <td class="value-cell">{{ hotel_contact_no }}</td>
+            </tr>
+            <tr>
+                <td class="label-cell">LEAD PASSENGER NAME (S)</td>
+                <td class="value-cell">{{ lead_passenger_name }}</td>
+            </tr>
+            <tr>
+                <td class="label-cell">ROOM TYPE</td>
+                <td class="value-cell">{{ room_type }}</td>
+            </tr>
+            <tr>
+                <td class="label-cell">INCLUSIONS</td>
+                <td class="value-cell">{{ inclusions }}</td>
+            </tr>
+            <tr>
+                <td class="label-cell">NO OF ROOMS</td>
+                <td class="value-cell">{{ no_of_rooms }}</td>
+            </tr>
+            <tr>
+                <td class="label-cell">NO OF ADULTS</td>
+                <td class="value-cell">{{ no_of_adults }}</td>
+            </tr>
+            <tr>
+                <td class="label-cell">NO OF CHILDREN</td>
+                <td class="value-cell">{{ no_of_children }}</td>
+            </tr>
+            <tr>
+                <td class="label-cell">CHECK-IN DATE</td>
+                <td class="value-cell">{{ check_in_date }}</td>
+            </tr>
+            <tr>
+                <td class="label-cell">CHECK-OUT DATE</td>
+                <td class="value-cell">{{ check_out_date }}</td>
+            </tr>
+            <tr>
+                <td class="label-cell">DURATION</td>
+                <td class="value-cell">{{ duration }}</td>
+            </tr>
+            <tr>
+                <td class="label-cell">CANCELLATION POLICY</td>
+                <td class="value-cell cancellation-highlight">{{ cancellation_policy }}</td>
+            </tr>
+            <tr>
+                <td class="label-cell">BOOKED AND PAYABLE BY</td>
+                <td class="value-cell">{{ booked_and_payable_by }}</td>
+            </tr>
+        </table>
+        
+        <div class="footer-note">
+            This voucher is valid for the above specified services only. Any other extra service shall be paid by the client at the hotel.
+        </div>
+    </div>
+</body>
+</html>
+"""
+
+def voucher_template() -> Template:
+    """Compile the voucher template, HTML-escaping every row value it renders"""
+    return Environment(autoescape=True).from_string(VOUCHER_TEMPLATE)
+
+def normalize_column_name(column: Any) -> str:
+    """Normalize an Excel header: lowercase, spaces and hyphens to underscores"""
+    return str(column).lower().replace(' ', '_').replace('-', '_')
+
+def clean_excel_rows(df: pd.DataFrame) -> List[Dict[str, str]]:
+    """Convert a DataFrame into rows of normalized keys and string values"""
+    cleaned_rows = []
+    for row in df.to_dict('records'):
+        # Convert all values to strings and handle NaN values
+        cleaned_row = {}
+        for key, value in row.items():
+            normalized_key = normalize_column_name(key)
+            if pd.isna(value):
+                cleaned_row[normalized_key] = ""
+            else:
+                cleaned_row[normalized_key] = str(value)
+        cleaned_rows.append(cleaned_row)
+    return cleaned_rows
+
+def describe_sheet(sheet_name: str, df: pd.DataFrame) -> Dict[str, Any]:
+    """Summarize a parsed worksheet and resolve its own column mapping"""
+    return {
+        "name": sheet_name,
+        "columns": [str(column) for column in df.columns],
+        "column_mapping": resolve_column_mapping(normalize_column_name(c) for c in df.columns),
+        "rows": clean_excel_rows(df),
+    }
+
+def parse_excel_sheet(contents: bytes, sheet_name: str) -> Dict[str, Any]:
+    """Parse a single worksheet; runs in a sheet pool process"""
+    return describe_sheet(sheet_name, pd.read_excel(io.BytesIO(contents), sheet_name=sheet_name))
+
+def sheet_pool() -> ProcessPoolExecutor:
+    """The shared sheet parsing pool, started on first use"""
+    global _sheet_pool
+    with _sheet_pool_lock:
+        if _sheet_pool is None:
+            # Spawned rather than forked: the API process runs threads that must not be copied mid-flight
+            _sheet_pool = ProcessPoolExecutor(
+                max_workers=SHEET_PARSE_WORKERS, mp_context=multiprocessing.get_context('spawn')
+            )
+        return _sheet_pool
+
+def shutdown_sheet_pool(pool: Optional[ProcessPoolExecutor] = None) -> None:
+    """Stop the sheet pool, or only ``pool`` if it is still the current one; the next parse starts afresh"""
+    global _sheet_pool
+    with _sheet_pool_lock:
+        if _sheet_pool is None or (pool is not None and _sheet_pool is not pool):
+            return
+        _sheet_pool.shutdown(wait=False, cancel_futures=True)
+        _sheet_pool = None
+
+def parse_excel_workbook(contents: bytes, sheets: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """Parse all (or the selected) sheets of a workbook, preserving sheet order.
+
+    Large workbooks with several selected sheets are parsed one sheet per
+    process, since parsing is CPU-bound and threads would serialize on the
+    GIL. Everything else is read in a single pass over the open workbook.
+    """
+    with pd.ExcelFile(io.BytesIO(contents)) as workbook:
+        available_sheets = [str(name) for name in workbook.sheet_names]
+
+        if sheets:
+            missing = [name for name in sheets if name not in available_sheets]
+            if missing:
+                raise ValueError(f"Sheet(s) not found in workbook: {', '.join(missing)}")
+            selected_sheets = [name for name in available_sheets if name in sheets]
+        else:
+            selected_sheets = available_sheets
+
+        if len(selected_sheets) < 2 or SHEET_PARSE_WORKERS < 2 or len(contents) < SHEET_PARSE_PARALLEL_MIN_BYTES:
+            frames = pd.read_excel(workbook, sheet_name=selected_sheets)
+            return [describe_sheet(name, frames[name]) for name in selected_sheets]
+
+    pool = sheet_pool()
+    try:
+        return list(pool.map(parse_excel_sheet, [contents] * len(selected_sheets), selected_sheets))
+    except BrokenProcessPool:
+        # A parse process died; the next workbook gets a fresh pool
+        logger.warning("Sheet parsing pool broke, restarting it")
+        shutdown_sheet_pool(pool)
+        raise
+
+def resolve_column_mapping(columns: Iterable[str]) -> Dict[str, Optional[str]]:
+    """Resolve which normalized column feeds each template variable"""
+    available = set(columns)
+    return {
+        template_key: next((col for col in possible_columns if col in available), None)
+        for template_key, possible_columns in COLUMN_MAPPING.items()
+    }
+
+def map_excel_data_to_template(data: Dict[str, Any]) -> Dict[str, str]:
+    """Map Excel column data to template variables with fallbacks"""
+    
+    result = {}
+    
+    for template_key, possible_columns in COLUMN_MAPPING.items():
+        value = ""
+        for col in possible_columns:
+            if col in data and data[col]:
+                value = str(data[col]).strip()
+                break
+        
+        # Set default values for missing data
+        if not value:
+            if template_key == 'date_voucher_issued':
+                value = datetime.now().strftime('%d-%b-%Y')
+            elif template_key == 'booked_and_payable_by':
+                value = 'LGT India'
+            elif template_key == 'map_location':
+                value = '#'
+            elif template_key in ['no_of_children', 'no_of_rooms', 'no_of_adults']:
+                value = '0'
+            else:
+                value = 'N/A'
+        
+        result[template_key] = value
+    
+    result['map_url'] = map_link_url(result['map_location'])
+    return result
+
+def map_link_url(location: str) -> str:
+    """Build the map link href: bare hosts get https://, script-capable schemes are dropped"""
+    # Browsers ignore whitespace and control characters inside a scheme ("java\tscript:")
+    compact = re.sub(r'[\x00-\x20]', '', location).lower()
+    if compact.startswith(UNSAFE_LINK_SCHEMES):
+        return '#'
+    if location.startswith(('#', '/')) or re.match(r'^[a-z][a-z0-9+.-]*://', compact) or compact.startswith('mailto:'):
+        return location
+    return f"https://{location}"
+
+def rows_to_columnar(vouchers: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Convert row vouchers to the compact columnar layout.
+
+    Field names are sent once and each field's values form one array.
+    Source sheets are dictionary-encoded as indexes into ``sheet_names``.
+    """
+    fields = list(dict.fromkeys(key for voucher in vouchers for key in voucher.get('data', {})))
+    sheet_names = list(dict.fromkeys(voucher.get('source_sheet') for voucher in vouchers if voucher.get('source_sheet')))
+    sheet_index = {name: i for i, name in enumerate(sheet_names)}
+    columnar = {
+        "layout": "columnar",
+        "fields": fields,
+        "row_numbers": [voucher.get('row_number', i + 1) for i, voucher in enumerate(vouchers)],
+        "values": [[voucher.get('data', {}).get(field, "") for voucher in vouchers] for field in fields]
+    }
+    if sheet_names:
+        columnar["sheet_names"] = sheet_names
+        columnar["sheets"] = [sheet_index.get(voucher.get('source_sheet'), -1) for voucher in vouchers]
+    return columnar
+
+def columnar_to_rows(columnar: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Expand a columnar voucher payload back into row vouchers"""
+    fields = columnar.get('fields', [])
+    values = columnar.get('values', [])
+    if not isinstance(fields, list) or not all(isinstance(field, str) for field in fields):
+        raise ValueError("Columnar 'fields' must be a list of strings")
+    if not isinstance(values, list) or not all(isinstance(column, list) for column in values):
+        raise ValueError("Columnar 'values' must be a list of arrays")
+    if len(fields) != len(values):
+        raise ValueError("Columnar payload must have one value array per field")
+    row_count = len(values[0]) if values else len(columnar.get('row_numbers') or [])
+    if any(len(column) != row_count for column in values):
+        raise ValueError("Columnar value arrays must all have the same length")
+    
+    row_numbers = columnar.get('row_numbers') or list(range(1, row_count + 1))
+    if not isinstance(row_numbers, list) or len(row_numbers) != row_count:
+        raise ValueError("Columnar 'row_numbers' must have one entry per row")
+    sheet_names = columnar.get('sheet_names', [])
+    sheets = columnar.get('sheets')
+    if sheets is not None and (not isinstance(sheets, list) or len(sheets) != row_count
+                               or not all(isinstance(index, int) for index in sheets)):
+        raise ValueError("Columnar 'sheets' must have one integer index per row")
+    rows = []
+    for i, row_values in enumerate(zip(*values) if values else ((),) * row_count):
+        row = {"row_number": row_numbers[i], "data": dict(zip(fields, row_values))}
+        if sheets is not None and 0 <= sheets[i] < len(sheet_names):
+            row["source_sheet"] = sheet_names[sheets[i]]
+        rows.append(row)
+    return rows
+
+def validate_vouchers(vouchers: List[Any]) -> List[Dict[str, Any]]:
+    """Check every voucher is a dict with a dict ``data`` before any work is admitted"""
+    for i, voucher in enumerate(vouchers):
+        if not isinstance(voucher, dict):
+            raise ValueError(f"Voucher {i + 1} must be an object")
+        if not isinstance(voucher.get('data'), dict):
+            raise ValueError(f"Voucher {i + 1} must have a 'data' object")
+    return vouchers
+
+def decode_vouchers(payload: Any) -> List[Dict[str, Any]]:
+    """Accept either a list of row vouchers or a columnar payload"""
+    if isinstance(payload, dict) and payload.get('layout') == 'columnar':
+        return validate_vouchers(columnar_to_rows(payload))
+    if isinstance(payload, list):
+        return validate_vouchers(payload)
+    raise ValueError("Expected a list of vouchers or a columnar voucher payload")
+
+def html_to_pdf(html_content: str) -> bytes:
+    """Render HTML to PDF, through the shared render service when one is configured"""
+    if render_service_client is not None:
+        try:
+            return render_service_client.render_pdf(html_content)
+        except OSError as e:
+            logger.warning(f"Render service unavailable, rendering locally: {str(e)}")
+    
+    # WeasyPrint is only loaded by workers that actually render in-process
+    import weasyprint
+    return weasyprint.HTML(string=html_content).write_pdf()
+
+def voucher_pdf_filename(template_data: Dict[str, str], index: int) -> str:
+    """Name of the PDF generated for a mapped voucher row"""
+    return f"voucher_{index}_{template_data.get('confirmation_number', 'unknown')}.pdf"
+
+def render_voucher_pdf(template: Template, data: Dict[str, Any], index: int) -> Tuple[str, bytes]:
+    """Render one voucher row and return its PDF filename and content"""
+    # Map Excel column names to template variables
+    template_data = map_excel_data_to_template(data)
+    
+    # Render HTML
+    html_content = template.render(**template_data)
+    
+    # Generate PDF
+    return voucher_pdf_filename(template_data, index), html_to_pdf(html_content)
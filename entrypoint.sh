@@ -4,9 +4,15 @@ set -e
 # Start the FastAPI backend
 cd /backend || { echo "Backend directory not found"; exit 1; }
 
+# All API workers share one render service and its warm PDF cache
+export RENDER_SERVICE_SOCKET="${RENDER_SERVICE_SOCKET:-/tmp/voucher-render.sock}"
+echo "Starting render service"
+python render_service.py --socket "$RENDER_SERVICE_SOCKET" --workers "${RENDER_WORKERS:-2}" &
+RENDER_PID=$!
+
 echo "Starting FastAPI backend"
 # Start Uvicorn with proper host binding
-uvicorn server:app --host 0.0.0.0 --port 8001 &
+uvicorn server:app --host 0.0.0.0 --port 8001 --workers "${API_WORKERS:-1}" &
 BACKEND_PID=$!
 
 echo "Waiting for backend to start..."
@@ -22,20 +28,23 @@ nginx -g 'daemon off;' &
 NGINX_PID=$!
 
 # Handle termination signals
-trap 'kill $BACKEND_PID $NGINX_PID; exit 0' SIGTERM SIGINT
+trap 'kill $BACKEND_PID $NGINX_PID $RENDER_PID; exit 0' SIGTERM SIGINT
 
 # Check if processes are still running
-while kill -0 $BACKEND_PID 2>/dev/null && kill -0 $NGINX_PID 2>/dev/null; do
+while kill -0 $BACKEND_PID 2>/dev/null && kill -0 $NGINX_PID 2>/dev/null && kill -0 $RENDER_PID 2>/dev/null; do
     sleep 1
 done
 
 # If we get here, one of the processes died
-if kill -0 $BACKEND_PID 2>/dev/null; then
+if ! kill -0 $RENDER_PID 2>/dev/null; then
+    echo "Render service died, shutting down backend and nginx..."
+    kill $BACKEND_PID $NGINX_PID 2>/dev/null || true
+elif kill -0 $BACKEND_PID 2>/dev/null; then
     echo "Nginx died, shutting down backend..."
-    kill $BACKEND_PID
+    kill $BACKEND_PID $RENDER_PID
 else
     echo "Backend died, shutting down nginx..."
-    kill $NGINX_PID
+    kill $NGINX_PID $RENDER_PID
 fi
 
 exit 1
@@ -0,0 +1,235 @@
+"""Load-test harness simulating concurrent agents against the voucher API.
+
+By default the FastAPI app runs in-process behind httpx's ASGI transport,
+with mongomock-motor standing in for MongoDB. That way the harness's event
+loop is the app's event loop, and the app's stall detector reports the call
+sites that block it. Pass --base-url to drive a running server instead.
+
+    python load_test.py --agents 20 --duration 60 --batch-size 500
+"""
+import argparse
+import asyncio
+import io
+import os
+import random
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import httpx
+import pandas as pd
+
+BACKEND_DIR = Path(__file__).parent / "backend"
+
+SAMPLE_ROW = {
+    "Confirmation Number": "399458300",
+    "Hotel Name": "Novotel Dubai Al Barsha 4*",
+    "Lead Passenger Name": "Mr PHILIP BENZIGAR",
+    "Address": "Sheikh Zayed Rd - opp. InsuranceMarket Metro Station - Al Barsha - Al Barsha 1 - Dubai - United Arab Emirates",
+    "Check-in Date": "08-May-2025 / 02 PM",
+    "Check-out Date": "14-May-2025 / 11 AM",
+    "Room Type": "Superior Double Room",
+    "No of Rooms": "01",
+    "No of Adults": "01",
+    "No of Children": "0",
+    "Duration": "06 Nights",
+    "Inclusions": "Breakfast & Wi-Fi",
+    "Hotel Contact No": "+971 4 304 9000",
+    "Cancellation Policy": "Free cancellation before 07 May 2025 11:59 AM"
+}
+
+class VoucherLoadTester:
+    def __init__(self, client: httpx.AsyncClient, batch_size: int, upload_rows: int):
+        self.client = client
+        self.batch_size = batch_size
+        self.upload_rows = upload_rows
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.statuses: Dict[str, Dict[int, int]] = defaultdict(lambda: defaultdict(int))
+        self.failures: Dict[str, int] = defaultdict(int)
+        self.workbook = self.create_workbook(upload_rows)
+        self.vouchers: List[Dict] = []
+
+    @staticmethod
+    def create_workbook(rows: int) -> bytes:
+        """Build an in-memory workbook with ``rows`` booking rows"""
+        df = pd.DataFrame([
+            {**SAMPLE_ROW, "Confirmation Number": str(399458300 + i)} for i in range(rows)
+        ])
+        buffer = io.BytesIO()
+        df.to_excel(buffer, index=False)
+        return buffer.getvalue()
+
+    async def timed(self, name: str, method: str, url: str, **kwargs) -> Optional[httpx.Response]:
+        """Send one request and record its latency and status under ``name``"""
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, **kwargs)
+        except Exception as e:
+            self.failures[name] += 1
+            print(f"❌ {name} failed: {str(e)}")
+            return None
+        self.latencies[name].append(time.perf_counter() - started)
+        self.statuses[name][response.status_code] += 1
+        return response
+
+    async def small_upload(self, agent_id: str):
+        files = {'file': ('bookings.xlsx', self.workbook, 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')}
+        response = await self.timed("upload-excel", "POST", "/api/upload-excel", files=files, headers={"X-API-Key": agent_id})
+        if response is not None and response.status_code == 200 and not self.vouchers:
+            self.vouchers = response.json()["vouchers"]
+
+    async def small_generation(self, agent_id: str):
+        vouchers = self.vouchers[:1] or [{"row_number": 1, "data": {"confirmation_number": "1"}}]
+        await self.timed("generate-vouchers (single)", "POST", "/api/generate-vouchers", json=vouchers, headers={"X-API-Key": agent_id})
+
+    async def huge_generation(self, agent_id: str):
+        template = self.vouchers[0]["data"] if self.vouchers else {"hotel_name": "Load Test Hotel"}
+        vouchers = [
+            {"row_number": i + 1, "data": {**template, "confirmation_number": str(500000000 + i)}}
+            for i in range(self.batch_size)
+        ]
+        await self.timed("generate-vouchers (batch)", "POST", "/api/generate-vouchers", json=vouchers, headers={"X-API-Key": agent_id})
+
+    async def preview(self, agent_id: str):
+        data = self.vouchers[0]["data"] if self.vouchers else {"confirmation_number": "1"}
+        await self.timed("vouchers/preview", "POST", "/api/vouchers/preview", json={"data": data}, headers={"X-API-Key": agent_id})
+
+    async def status_poll(self, agent_id: str):
+        await self.timed("status (GET)", "GET", "/api/status")
+
+    async def status_post(self, agent_id: str):
+        await self.timed("status (POST)", "POST", "/api/status", json={"client_name": agent_id})
+
+    async def agent(self, agent_id: str, deadline: float, weights: Dict[str, float]):
+        """Run random scenarios for one simulated agent until the deadline"""
+        scenarios = {
+            "upload": self.small_upload,
+            "single": self.small_generation,
+            "batch": self.huge_generation,
+            "preview": self.preview,
+            "poll": self.status_poll,
+            "post": self.status_post,
+        }
+        names = list(weights)
+        while time.perf_counter() < deadline:
+            scenario = random.choices(names, weights=[weights[name] for name in names])[0]
+            await scenarios[scenario](agent_id)
+            # Think time between requests
+            await asyncio.sleep(random.uniform(0.05, 0.25))
+
+    def print_report(self, elapsed: float, monitor):
+        """Print throughput, latency percentiles and event-loop stalls"""
+        print("\n" + "="*100)
+        print(f"📊 LOAD TEST REPORT ({elapsed:.1f}s)")
+        print("="*100)
+        print(f"{'endpoint':<30}{'count':>7}{'req/s':>8}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}  statuses")
+        for name in sorted(set(self.latencies) | set(self.failures)):
+            samples = sorted(self.latencies.get(name, []))
+            statuses = ", ".join(f"{code}×{count}" for code, count in sorted(self.statuses[name].items()))
+            if self.failures.get(name):
+                statuses += f", errors×{self.failures[name]}"
+            if not samples:
+                print(f"{name:<30}{0:>7}{0:>8.2f}{'-':>10}{'-':>10}{'-':>10}{'-':>10}  {statuses}")
+                continue
+            print(
+                f"{name:<30}{len(samples):>7}{len(samples) / elapsed:>8.2f}"
+                f"{percentile(samples, 50) * 1000:>10.0f}{percentile(samples, 90) * 1000:>10.0f}"
+                f"{percentile(samples, 99) * 1000:>10.0f}{samples[-1] * 1000:>10.0f}  {statuses}"
+            )
+        total = sum(len(samples) for samples in self.latencies.values())
+        print(f"\nTotal: {total} requests, {total / elapsed:.2f} req/s")
+
+        if monitor is not None:
+            print(
+                f"Event loop: {monitor.stalls} stalls ≥ {monitor.threshold * 1000:.0f} ms, "
+                f"{monitor.stall_seconds:.2f}s stalled ({monitor.stall_seconds / elapsed:.1%} of run), "
+                f"max lag {monitor.max_lag * 1000:.0f} ms"
+            )
+            for site, count in monitor.sites.most_common(10):
+                print(f"  {count:>5}× {site}")
+
+def percentile(sorted_samples: List[float], pct: float) -> float:
+    """Nearest-rank percentile of already sorted samples"""
+    index = max(0, min(len(sorted_samples) - 1, round(pct / 100 * len(sorted_samples)) - 1))
+    return sorted_samples[index]
+
+def agent_keys(agents: int) -> List[str]:
+    """API keys the simulated agents send, so each gets its own render quota"""
+    return ["warmup"] + [f"agent-{i}" for i in range(agents)]
+
+def load_server(agents: int):
+    """Import the backend with an in-memory MongoDB stand-in"""
+    from mongomock_motor import AsyncMongoMockClient
+
+    sys.path.insert(0, str(BACKEND_DIR))
+    os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+    os.environ.setdefault("DB_NAME", "load_test")
+    os.environ.setdefault("API_KEYS", ",".join(agent_keys(agents)))
+    import server
+
+    server.db = AsyncMongoMockClient()[os.environ["DB_NAME"]]
+    return server
+
+async def run(args) -> int:
+    weights = {
+        "upload": args.upload_weight,
+        "single": args.single_weight,
+        "batch": args.batch_weight,
+        "preview": args.preview_weight,
+        "poll": args.poll_weight,
+        "post": args.post_weight,
+    }
+
+    if args.base_url:
+        print(f"🔍 Load testing Hotel Voucher Generator API at: {args.base_url}")
+        print(f"Agents get separate render quotas only if the server's API_KEYS lists: {','.join(agent_keys(args.agents))}")
+        client = httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout)
+        monitor = None
+    else:
+        print("🔍 Load testing in-process Hotel Voucher Generator API")
+        server = load_server(args.agents)
+        client = httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=server.app), base_url="http://loadtest", timeout=args.timeout
+        )
+        # The app's own stall detector; only meaningful when the app shares this event loop
+        monitor = server.loop_monitor
+        monitor.threshold = args.stall_threshold_ms / 1000
+        monitor.start()
+
+    print(f"{args.agents} agents for {args.duration}s, batch size {args.batch_size}, upload rows {args.upload_rows}")
+    async with client:
+        tester = VoucherLoadTester(client, args.batch_size, args.upload_rows)
+        # Warm up so every scenario has parsed vouchers to work with
+        await tester.small_upload("warmup")
+
+        started = time.perf_counter()
+        deadline = started + args.duration
+        await asyncio.gather(*(tester.agent(f"agent-{i}", deadline, weights) for i in range(args.agents)))
+        elapsed = time.perf_counter() - started
+
+    if monitor is not None:
+        await monitor.stop()
+    tester.print_report(elapsed, monitor)
+    return 1 if any(tester.failures.values()) else 0
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate concurrent agents against the voucher API")
+    parser.add_argument("--base-url", help="Test a running server instead of the in-process app")
+    parser.add_argument("--agents", type=int, default=10, help="Concurrent simulated agents")
+    parser.add_argument("--duration", type=float, default=30, help="Test duration in seconds")
+    parser.add_argument("--batch-size", type=int, default=200, help="Vouchers per huge generation batch")
+    parser.add_argument("--upload-rows", type=int, default=20, help="Rows in each uploaded workbook")
+    parser.add_argument("--timeout", type=float, default=300, help="Per-request timeout in seconds")
+    parser.add_argument("--stall-threshold-ms", type=float, default=50, help="Event-loop lag counted as a stall")
+    parser.add_argument("--upload-weight", type=float, default=30)
+    parser.add_argument("--single-weight", type=float, default=15)
+    parser.add_argument("--batch-weight", type=float, default=2)
+    parser.add_argument("--preview-weight", type=float, default=10)
+    parser.add_argument("--poll-weight", type=float, default=35)
+    parser.add_argument("--post-weight", type=float, default=8)
+    return asyncio.run(run(parser.parse_args()))
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,76 @@
+import asyncio
+import io
+import zipfile
+
+import pytest
+from fastapi.testclient import TestClient
+from mongomock_motor import AsyncMongoMockClient
+
+import server
+import vouchers
+
+def html_as_pdf(html_content):
+    return html_content.encode()
+
+@pytest.fixture
+def db(monkeypatch):
+    database = AsyncMongoMockClient()["bulk_import_test"]
+    monkeypatch.setattr(server, "db", database)
+    # The "PDF" is the rendered HTML, so tests can see what went into each voucher
+    monkeypatch.setattr(vouchers, "html_to_pdf", html_as_pdf)
+    return database
+
+@pytest.fixture
+def client():
+    return TestClient(server.app)
+
+def insert(db, documents):
+    asyncio.run(db.bookings.insert_many(documents))
+
+def archive_contents(response):
+    with zipfile.ZipFile(io.BytesIO(response.content)) as archive:
+        return {name: archive.read(name).decode() for name in archive.namelist()}
+
+def test_records_keyed_like_spreadsheet_headers_are_mapped(db, client):
+    insert(db, [
+        {"Confirmation Number": "77", "Guest Name": "Mr PHILIP BENZIGAR", "Hotel Name": "Novotel", "Check-in Date": "08-May-2025"},
+        {"confirmation_number": "78", "guest_name": "Ms ANA LIMA", "notes": "not mapped"},
+    ])
+
+    response = client.post("/api/generate-vouchers/from-db", json={})
+    assert response.status_code == 200
+    contents = archive_contents(response)
+    assert sorted(contents) == ["voucher_1_77.pdf", "voucher_2_78.pdf"]
+    assert "Mr PHILIP BENZIGAR" in contents["voucher_1_77.pdf"]
+    assert "Novotel" in contents["voucher_1_77.pdf"]
+    assert "08-May-2025" in contents["voucher_1_77.pdf"]
+    assert "Ms ANA LIMA" in contents["voucher_2_78.pdf"]
+    assert server.render_scheduler.outstanding == 0
+
+def test_filter_and_limit_select_records(db, client):
+    insert(db, [{"confirmation_number": str(i), "hotel_name": "Ibis" if i % 2 else "Hilton"} for i in range(10)])
+
+    response = client.post("/api/generate-vouchers/from-db", json={"filter": {"hotel_name": "Ibis"}, "limit": 3})
+    assert response.status_code == 200
+    assert len(archive_contents(response)) == 3
+
+def test_no_matching_records_is_404(db, client):
+    response = client.post("/api/generate-vouchers/from-db", json={"filter": {"hotel_name": "nowhere"}})
+    assert response.status_code == 404
+
+def test_clean_db_record_keeps_only_mapped_fields():
+    assert server.clean_db_record({"Guest Name": "A", "Room Type": None, "internal_notes": "x"}) == {
+        "guest_name": "A",
+        "room_type": "",
+    }
+
+@pytest.mark.parametrize("body", [
+    {"collection": "system.users"},
+    {"collection": "status_checks"},
+    {"filter": {"$where": "sleep(1000)"}},
+    {"filter": {"$or": [{"hotel_name": "Ibis"}, {"$expr": {"$function": {"body": "", "args": [], "lang": "js"}}}]}},
+    {"filter": {"$expr": {"$accumulator": {}}}},
+])
+def test_unsafe_collections_and_filters_are_rejected(db, client, body):
+    response = client.post("/api/generate-vouchers/from-db", json=body)
+    assert response.status_code == 422
@@ -0,0 +1,105 @@
+import json
+import zipfile
+
+import pytest
+from typer.testing import CliRunner
+
+import cli
+import vouchers
+
+ROWS = [{"row_number": i, "data": {"confirmation_number": str(1000 + i)}} for i in range(1, 6)]
+
+runner = CliRunner()
+
+def fake_pdf(html_content):
+    return b"%PDF-1.4 test"
+
+@pytest.fixture(autouse=True)
+def no_weasyprint(monkeypatch):
+    # Worker processes are forked, so they inherit the patched renderer
+    monkeypatch.setattr(vouchers, "html_to_pdf", fake_pdf)
+
+@pytest.fixture
+def input_path(tmp_path):
+    path = tmp_path / "vouchers.json"
+    path.write_text(json.dumps(ROWS))
+    return path
+
+def generate(input_path, output_dir, *args):
+    result = runner.invoke(cli.app, [str(input_path), "-o", str(output_dir), "-w", "1", "-c", "2", *args])
+    assert result.exit_code == 0, result.output
+    return result.output
+
+def rendered_rows(output_dir):
+    return sorted(int(path.name.split("_")[1]) for path in output_dir.glob("voucher_*.pdf"))
+
+def test_checkpoint_round_trip(tmp_path, input_path):
+    checkpoint_path = tmp_path / cli.CHECKPOINT_FILENAME
+    fingerprint = cli.input_fingerprint(input_path)
+    assert cli.read_checkpoint(checkpoint_path, fingerprint) == 1
+
+    cli.write_checkpoint(checkpoint_path, fingerprint, 4)
+    assert cli.read_checkpoint(checkpoint_path, fingerprint) == 4
+    assert not checkpoint_path.with_suffix(".tmp").exists()
+
+def test_checkpoint_is_ignored_for_a_different_input(tmp_path, input_path):
+    checkpoint_path = tmp_path / cli.CHECKPOINT_FILENAME
+    cli.write_checkpoint(checkpoint_path, cli.input_fingerprint(input_path), 4)
+
+    other_input = tmp_path / "other.json"
+    other_input.write_text(json.dumps(ROWS[:2]))
+    assert cli.read_checkpoint(checkpoint_path, cli.input_fingerprint(other_input)) == 1
+    # The sheet selection is part of the input
+    assert cli.read_checkpoint(checkpoint_path, cli.input_fingerprint(input_path, ["May"])) == 1
+
+def test_pdf_run_resumes_from_checkpoint_and_clears_it(tmp_path, input_path):
+    output_dir = tmp_path / "out"
+    output_dir.mkdir()
+    checkpoint_path = output_dir / cli.CHECKPOINT_FILENAME
+    cli.write_checkpoint(checkpoint_path, cli.input_fingerprint(input_path), 3)
+
+    output = generate(input_path, output_dir, "-f", "pdf")
+    assert "3 to render from row 3" in output
+    assert rendered_rows(output_dir) == [3, 4, 5]
+    assert not checkpoint_path.exists()
+
+    # A completed run leaves nothing behind that would make the next run skip rows
+    output = generate(input_path, output_dir, "-f", "pdf")
+    assert "5 to render from row 1" in output
+
+def test_fresh_and_resume_from_override_the_checkpoint(tmp_path, input_path):
+    output_dir = tmp_path / "out"
+    output_dir.mkdir()
+    cli.write_checkpoint(output_dir / cli.CHECKPOINT_FILENAME, cli.input_fingerprint(input_path), 3)
+
+    assert "2 to render from row 4" in generate(input_path, output_dir, "-f", "pdf", "--resume-from", "4")
+    cli.write_checkpoint(output_dir / cli.CHECKPOINT_FILENAME, cli.input_fingerprint(input_path), 3)
+    assert "5 to render from row 1" in generate(input_path, output_dir, "-f", "pdf", "--fresh")
+
+def test_zip_run_archives_only_this_inputs_vouchers(tmp_path, input_path):
+    output_dir = tmp_path / "out"
+    output_dir.mkdir()
+    stale = output_dir / "voucher_99_stale.pdf"
+    stale.write_bytes(b"%PDF-1.4 other run")
+
+    generate(input_path, output_dir, "-f", "zip")
+    (zip_path,) = output_dir.glob("hotel_vouchers_*.zip")
+    with zipfile.ZipFile(zip_path) as archive:
+        assert sorted(archive.namelist()) == sorted(f"voucher_{i}_{1000 + i}.pdf" for i in range(1, 6))
+    assert stale.exists()
+    assert rendered_rows(output_dir) == [99]
+    assert not (output_dir / cli.CHECKPOINT_FILENAME).exists()
+
+def test_zip_run_after_resume_includes_earlier_vouchers(tmp_path, input_path):
+    output_dir = tmp_path / "out"
+    output_dir.mkdir()
+    # Rows 1-2 were rendered by an interrupted run
+    for i in (1, 2):
+        (output_dir / f"voucher_{i}_{1000 + i}.pdf").write_bytes(b"%PDF-1.4 earlier")
+    cli.write_checkpoint(output_dir / cli.CHECKPOINT_FILENAME, cli.input_fingerprint(input_path), 3)
+
+    output = generate(input_path, output_dir, "-f", "zip")
+    assert "3 to render from row 3" in output
+    (zip_path,) = output_dir.glob("hotel_vouchers_*.zip")
+    with zipfile.ZipFile(zip_path) as archive:
+        assert len(archive.namelist()) == 5
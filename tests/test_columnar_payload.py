@@ -0,0 +1,84 @@
+import gzip
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+import server
+from vouchers import columnar_to_rows, decode_vouchers, rows_to_columnar
+
+VOUCHERS = [
+    {"row_number": 2, "source_sheet": "May", "data": {"hotel_name": "Novotel", "confirmation_number": "1"}},
+    {"row_number": 3, "source_sheet": "June", "data": {"hotel_name": "Hilton", "confirmation_number": "2"}},
+    {"row_number": 4, "source_sheet": "May", "data": {"hotel_name": "Ibis", "confirmation_number": "3"}},
+]
+
+@pytest.fixture
+def client():
+    return TestClient(server.app)
+
+def test_columnar_round_trip():
+    columnar = rows_to_columnar(VOUCHERS)
+    assert columnar["fields"] == ["hotel_name", "confirmation_number"]
+    assert columnar["sheet_names"] == ["May", "June"]
+    assert columnar["sheets"] == [0, 1, 0]
+    assert columnar_to_rows(columnar) == VOUCHERS
+
+def test_columnar_fills_missing_fields_and_default_row_numbers():
+    columnar = rows_to_columnar([{"data": {"a": "1"}}, {"data": {"b": "2"}}])
+    assert columnar_to_rows(columnar) == [
+        {"row_number": 1, "data": {"a": "1", "b": ""}},
+        {"row_number": 2, "data": {"a": "", "b": "2"}},
+    ]
+    assert columnar_to_rows({"layout": "columnar", "fields": ["a"], "values": [["x", "y"]]}) == [
+        {"row_number": 1, "data": {"a": "x"}},
+        {"row_number": 2, "data": {"a": "y"}},
+    ]
+
+def test_decode_vouchers_accepts_rows_and_columnar():
+    assert decode_vouchers(VOUCHERS) == VOUCHERS
+    assert decode_vouchers(rows_to_columnar(VOUCHERS)) == VOUCHERS
+
+@pytest.mark.parametrize("payload", [
+    {"layout": "columnar", "fields": ["a", "b"], "values": [["1"]]},
+    {"layout": "columnar", "fields": ["a", "b"], "values": [["1", "2"], ["3"]]},
+    {"layout": "columnar", "fields": "a", "values": [["1"]]},
+    {"layout": "columnar", "fields": ["a"], "values": ["1"]},
+    {"layout": "columnar", "fields": ["a"], "values": [["1"]], "row_numbers": [1, 2]},
+    {"layout": "columnar", "fields": ["a"], "values": [["1"]], "sheet_names": ["May"], "sheets": ["May"]},
+    [{"row_number": 1, "data": "not an object"}],
+    ["not a voucher"],
+    {"vouchers": []},
+])
+def test_decode_vouchers_rejects_malformed_payloads(payload):
+    with pytest.raises(ValueError):
+        decode_vouchers(payload)
+
+@pytest.mark.parametrize("body", [
+    json.dumps({"layout": "columnar", "fields": ["a", "b"], "values": [["1"]]}),
+    json.dumps([{"row_number": 1, "data": None}]),
+    json.dumps({"not": "vouchers"}),
+    "{not json",
+])
+def test_generate_vouchers_rejects_malformed_payloads_with_400(client, body):
+    response = client.post("/api/generate-vouchers", content=body, headers={"Content-Type": "application/json"})
+    assert response.status_code == 400
+    # Nothing was admitted for a request that never started rendering
+    assert server.render_scheduler.outstanding == 0
+
+def test_generate_vouchers_rejects_malformed_compressed_payload_with_400(client):
+    body = gzip.compress(json.dumps({"layout": "columnar", "fields": ["a"], "values": [["1"], ["2"]]}).encode())
+    response = client.post(
+        "/api/generate-vouchers",
+        content=body,
+        headers={"Content-Type": "application/json", "Content-Encoding": "gzip"},
+    )
+    assert response.status_code == 400
+
+def test_generate_vouchers_rejects_unknown_content_encoding(client):
+    response = client.post(
+        "/api/generate-vouchers",
+        content=b"[]",
+        headers={"Content-Type": "application/json", "Content-Encoding": "compress"},
+    )
+    assert response.status_code == 415
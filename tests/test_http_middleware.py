@@ -0,0 +1,121 @@
+import asyncio
+import gzip
+import json
+
+from starlette.applications import Starlette
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+from http_middleware import CompressionCachingMiddleware, choose_encoding, etag_matches
+
+PAYLOAD = {"vouchers": [{"row_number": i, "data": {"hotel_name": "Novotel Dubai"}} for i in range(200)]}
+ZIP_CHUNKS = [b"PK\x03\x04" + b"\x00" * 2048, b"\x01" * 2048, b"PK\x05\x06"]
+
+async def vouchers(request):
+    return JSONResponse(PAYLOAD)
+
+async def tiny(request):
+    return JSONResponse({"ok": True})
+
+async def archive(request):
+    async def chunks():
+        for chunk in ZIP_CHUNKS:
+            yield chunk
+    return StreamingResponse(chunks(), media_type="application/zip")
+
+app = CompressionCachingMiddleware(
+    Starlette(routes=[
+        Route("/vouchers", vouchers, methods=["GET", "POST"]),
+        Route("/tiny", tiny),
+        Route("/archive", archive),
+    ]),
+    minimum_size=1024,
+)
+
+def request(path, method="GET", headers=None):
+    """Call the middleware directly and return the start message headers, status and body messages"""
+    scope = {
+        "type": "http",
+        "method": method,
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "scheme": "http",
+        "server": ("testserver", 80),
+        "headers": [(name.lower().encode(), value.encode()) for name, value in (headers or {}).items()],
+    }
+    messages = []
+    received = False
+
+    async def receive():
+        nonlocal received
+        if received:
+            # The client stays connected until the response is complete
+            await asyncio.Event().wait()
+        received = True
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(app(scope, receive, send))
+    start = messages[0]
+    bodies = [message.get("body", b"") for message in messages[1:]]
+    return start["status"], Headers(raw=start["headers"]), bodies
+
+def test_choose_encoding_respects_quality_values():
+    assert choose_encoding("gzip, br") == "br"
+    assert choose_encoding("gzip, br;q=0") == "gzip"
+    assert choose_encoding("identity") is None
+    assert choose_encoding("*") == "gzip"
+
+def test_etag_matches_uses_weak_comparison():
+    assert etag_matches('W/"abc"', 'W/"abc"')
+    assert etag_matches('"xyz", "abc"', 'W/"abc"')
+    assert etag_matches("*", 'W/"abc"')
+    assert not etag_matches('"xyz"', 'W/"abc"')
+
+def test_large_json_is_compressed_with_matching_content_length():
+    status, headers, bodies = request("/vouchers", headers={"Accept-Encoding": "gzip"})
+    body = b"".join(bodies)
+    assert status == 200
+    assert headers["content-encoding"] == "gzip"
+    assert int(headers["content-length"]) == len(body)
+    assert json.loads(gzip.decompress(body)) == PAYLOAD
+    assert "Accept-Encoding" in headers["vary"]
+
+def test_small_or_unaccepted_bodies_are_not_compressed():
+    _, headers, bodies = request("/tiny", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in headers
+    assert json.loads(b"".join(bodies)) == {"ok": True}
+
+    _, headers, bodies = request("/vouchers")
+    assert "content-encoding" not in headers
+    assert int(headers["content-length"]) == len(b"".join(bodies))
+
+def test_zip_streams_through_untouched():
+    status, headers, bodies = request("/archive", headers={"Accept-Encoding": "gzip"})
+    assert status == 200
+    assert "content-encoding" not in headers
+    assert "etag" not in headers
+    # Chunks are forwarded as they are produced, not buffered into one body
+    assert [body for body in bodies if body] == ZIP_CHUNKS
+
+def test_get_responses_carry_an_etag_and_revalidate_with_304():
+    _, headers, _ = request("/vouchers", headers={"Accept-Encoding": "gzip"})
+    etag = headers["etag"]
+    assert etag.startswith('W/"')
+    assert headers["cache-control"] == "no-cache"
+
+    status, headers, bodies = request("/vouchers", headers={"Accept-Encoding": "gzip", "If-None-Match": etag})
+    assert status == 304
+    assert headers["etag"] == etag
+    assert b"".join(bodies) == b""
+    assert "content-length" not in headers
+
+def test_post_responses_are_never_tagged_or_answered_with_304():
+    status, headers, _ = request("/vouchers", method="POST", headers={"If-None-Match": "*"})
+    assert status == 200
+    assert "etag" not in headers
@@ -0,0 +1,65 @@
+import asyncio
+import selectors
+import socket
+import sys
+import threading
+import time
+
+from loop_monitor import IDLE_SITE, EventLoopMonitor, describe_call_site
+
+def sample_thread(target):
+    """Run target in a thread and describe the call site of its stack while it runs"""
+    started = threading.Event()
+    done = threading.Event()
+    thread = threading.Thread(target=target, args=(started, done), daemon=True)
+    thread.start()
+    assert started.wait(5)
+    time.sleep(0.05)
+    try:
+        return describe_call_site(sys._current_frames()[thread.ident])
+    finally:
+        done.set()
+        thread.join(5)
+
+def blocking_work(started, done):
+    started.set()
+    while not done.is_set():
+        time.sleep(0.01)
+
+def idle_selector(started, done):
+    reader, writer = socket.socketpair()
+    with selectors.DefaultSelector() as selector:
+        selector.register(reader, selectors.EVENT_READ)
+        started.set()
+        while not done.is_set():
+            selector.select(timeout=0.5)
+    reader.close()
+    writer.close()
+
+def test_blocking_frame_is_reported_as_call_site():
+    site, stack = sample_thread(blocking_work)
+    assert "blocking_work" in site
+    assert stack
+
+def test_idle_selector_is_not_reported_as_call_site():
+    site, stack = sample_thread(idle_selector)
+    assert site == IDLE_SITE
+    assert stack == []
+
+def test_stalls_are_counted_and_exported():
+    async def scenario():
+        monitor = EventLoopMonitor(threshold=0.05, interval=0.01)
+        monitor.start()
+        await asyncio.sleep(0.05)
+        time.sleep(0.2)
+        await asyncio.sleep(0.05)
+        await monitor.stop()
+        return monitor
+
+    monitor = asyncio.run(scenario())
+    assert monitor.stalls >= 1
+    assert monitor.max_lag >= 0.15
+    assert any("scenario" in site for site in monitor.sites)
+    metrics = monitor.prometheus_metrics()
+    assert "event_loop_stalls_total" in metrics
+    assert 'event_loop_lag_seconds_bucket{le="+Inf"}' in metrics
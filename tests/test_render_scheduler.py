@@ -0,0 +1,125 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from render_scheduler import RenderQueueFull, RenderScheduler
+
+def make_scheduler(slots=1, client_slots=1, queue_limit=100, client_queue_limit=50):
+    return RenderScheduler(
+        slots=slots,
+        client_slots=client_slots,
+        queue_limit=queue_limit,
+        client_queue_limit=client_queue_limit,
+        executor=ThreadPoolExecutor(max_workers=slots),
+    )
+
+def test_queued_jobs_are_served_round_robin():
+    async def scenario():
+        scheduler = make_scheduler()
+        order = []
+        gate = threading.Event()
+
+        def job(name):
+            gate.wait(5)
+            order.append(name)
+
+        big = scheduler.submit_batch("big", job, [(f"big-{i}",) for i in range(4)])
+        small = scheduler.submit_batch("small", job, [("small-0",)])
+        gate.set()
+        await asyncio.gather(*big, *small)
+        scheduler.shutdown()
+        return order
+
+    order = asyncio.run(scenario())
+    assert order[0] == "big-0"
+    # The small request is not stuck behind the rest of the large batch
+    assert order.index("small-0") < order.index("big-3")
+
+def test_client_slots_cap_concurrency_per_client():
+    async def scenario():
+        scheduler = make_scheduler(slots=3, client_slots=1)
+        lock = threading.Lock()
+        running = 0
+        peak = 0
+
+        def job():
+            nonlocal running, peak
+            with lock:
+                running += 1
+                peak = max(peak, running)
+            threading.Event().wait(0.02)
+            with lock:
+                running -= 1
+
+        await asyncio.gather(*scheduler.submit_batch("agent", job, [()] * 5))
+        scheduler.shutdown()
+        return peak
+
+    assert asyncio.run(scenario()) == 1
+
+def test_reserve_and_release_track_outstanding_jobs():
+    scheduler = make_scheduler(queue_limit=10, client_queue_limit=6)
+    scheduler.reserve("a", 4)
+    scheduler.reserve("b", 5)
+    assert scheduler.outstanding == 9
+
+    with pytest.raises(RenderQueueFull) as client_full:
+        scheduler.reserve("a", 3)
+    assert client_full.value.retry_after >= 1
+    with pytest.raises(RenderQueueFull):
+        scheduler.reserve("c", 2)
+    # Rejected reservations leave the accounting untouched
+    assert scheduler.outstanding == 9
+
+    scheduler.release("a", 4)
+    scheduler.release("b", 5)
+    assert scheduler.outstanding == 0
+    scheduler.shutdown()
+
+def test_reserved_jobs_are_released_when_they_finish():
+    async def scenario():
+        scheduler = make_scheduler(slots=2, client_slots=2)
+        scheduler.reserve("a", 3)
+        results = await asyncio.gather(*scheduler.submit_batch("a", pow, [(2, i) for i in range(3)], reserved=True))
+        outstanding = scheduler.outstanding
+        scheduler.shutdown()
+        return results, outstanding
+
+    results, outstanding = asyncio.run(scenario())
+    assert results == [1, 2, 4]
+    assert outstanding == 0
+
+def test_submit_batch_admits_whole_batch_or_nothing():
+    async def scenario():
+        scheduler = make_scheduler(client_queue_limit=3)
+        with pytest.raises(RenderQueueFull):
+            scheduler.submit_batch("a", pow, [(2, i) for i in range(4)])
+        outstanding = scheduler.outstanding
+        scheduler.shutdown()
+        return outstanding
+
+    assert asyncio.run(scenario()) == 0
+
+def test_cancelled_queued_jobs_are_skipped_and_released():
+    async def scenario():
+        scheduler = make_scheduler()
+        ran = []
+        gate = threading.Event()
+
+        def job(name):
+            gate.wait(5)
+            ran.append(name)
+
+        first, second, third = scheduler.submit_batch("a", job, [("first",), ("second",), ("third",)])
+        second.cancel()
+        gate.set()
+        await asyncio.gather(first, third)
+        outstanding = scheduler.outstanding
+        scheduler.shutdown()
+        return ran, outstanding
+
+    ran, outstanding = asyncio.run(scenario())
+    assert ran == ["first", "third"]
+    assert outstanding == 0
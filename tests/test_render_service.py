@@ -0,0 +1,102 @@
+import asyncio
+import os
+import threading
+
+import pytest
+
+import render_service
+from render_service import (
+    PdfCache,
+    RenderService,
+    RenderServiceClient,
+    RenderServiceUnavailable,
+    prometheus_metrics,
+)
+
+def echo_pdf(html_content):
+    return f"%PDF {html_content}".encode()
+
+def crash_once(html_content):
+    # The first render kills its process, as an OOM kill would
+    marker = html_content.split("|")[0]
+    if not os.path.exists(marker):
+        open(marker, "w").close()
+        os._exit(1)
+    return echo_pdf(html_content)
+
+def always_crash(html_content):
+    os._exit(1)
+
+def test_pdf_cache_evicts_least_recently_used_by_size():
+    cache = PdfCache(max_bytes=10)
+    cache.put("a", b"1234")
+    cache.put("b", b"1234")
+    assert cache.get("a") == b"1234"
+    cache.put("c", b"1234")
+    assert cache.get("b") is None
+    assert cache.stats() == {"hits": 1, "misses": 1, "entries": 2, "bytes": 8, "max_bytes": 10}
+
+def test_repeated_renders_are_answered_from_the_cache(monkeypatch):
+    monkeypatch.setattr(render_service, "_render_pdf", echo_pdf)
+
+    async def scenario():
+        service = RenderService(workers=1, cache_bytes=1024)
+        try:
+            first, second = await asyncio.gather(service.render_pdf("<p>1</p>"), service.render_pdf("<p>1</p>"))
+            third = await service.render_pdf("<p>1</p>")
+        finally:
+            service.executor.shutdown()
+        return first, second, third, service.cache.stats()
+
+    first, second, third, stats = asyncio.run(scenario())
+    assert first == second == third == b"%PDF <p>1</p>"
+    assert stats["hits"] == 1
+    assert stats["entries"] == 1
+
+def test_broken_pool_is_restarted_and_the_render_retried(monkeypatch, tmp_path):
+    monkeypatch.setattr(render_service, "_render_pdf", crash_once)
+
+    async def scenario():
+        service = RenderService(workers=1, cache_bytes=1024)
+        original = service.executor
+        try:
+            content = await service.render_pdf(f"{tmp_path / 'crashed'}|<p>1</p>")
+            assert service.executor is not original
+            # The replacement pool keeps serving later renders
+            later = await service.render_pdf(f"{tmp_path / 'crashed'}|<p>2</p>")
+        finally:
+            service.executor.shutdown()
+        return content, later
+
+    content, later = asyncio.run(scenario())
+    assert (tmp_path / "crashed").exists()
+    assert content.endswith(b"<p>1</p>")
+    assert later.endswith(b"<p>2</p>")
+
+def test_client_reports_a_pool_that_keeps_breaking_as_unavailable(monkeypatch, tmp_path):
+    monkeypatch.setattr(render_service, "_render_pdf", always_crash)
+    socket_path = str(tmp_path / "render.sock")
+    service = RenderService(workers=1, cache_bytes=1024)
+    loop = asyncio.new_event_loop()
+    ready = threading.Event()
+
+    async def serve():
+        server = await asyncio.start_unix_server(service.handle_connection, path=socket_path)
+        ready.set()
+        async with server:
+            await server.serve_forever()
+
+    thread = threading.Thread(target=loop.run_until_complete, args=(serve(),), daemon=True)
+    thread.start()
+    assert ready.wait(5)
+    try:
+        client = RenderServiceClient(socket_path, timeout=30)
+        with pytest.raises(RenderServiceUnavailable):
+            client.render_pdf("<p>1</p>")
+        # Callers fall back to local rendering on OSError
+        assert issubclass(RenderServiceUnavailable, OSError)
+        stats = client.stats()
+        assert stats["in_flight"] == 0
+        assert "render_cache_misses_total 1" in prometheus_metrics(stats)
+    finally:
+        service.executor.shutdown(wait=False, cancel_futures=True)
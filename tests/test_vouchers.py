@@ -0,0 +1,72 @@
+import io
+
+import pandas as pd
+import pytest
+
+import vouchers
+from vouchers import map_excel_data_to_template, map_link_url, parse_excel_workbook, voucher_template
+
+@pytest.mark.parametrize("location, url", [
+    ("https://maps.google.com/?q=Dubai", "https://maps.google.com/?q=Dubai"),
+    ("maps.app.goo.gl/xyz", "https://maps.app.goo.gl/xyz"),
+    ("www.google.com/maps/@25.1,55.2,15z", "https://www.google.com/maps/@25.1,55.2,15z"),
+    ("#", "#"),
+    ("javascript:alert(1)", "#"),
+    (" JaVa\tScript:alert(1)", "#"),
+    ("data:text/html,<script>alert(1)</script>", "#"),
+    ("vbscript:msgbox", "#"),
+])
+def test_map_link_url(location, url):
+    assert map_link_url(location) == url
+
+def test_map_location_text_is_kept_as_the_link_label():
+    template_data = map_excel_data_to_template({"map_link": "maps.app.goo.gl/xyz"})
+    assert template_data["map_location"] == "maps.app.goo.gl/xyz"
+    html = voucher_template().render(**template_data)
+    assert '<a href="https://maps.app.goo.gl/xyz" class="map-link">maps.app.goo.gl/xyz</a>' in html
+
+def test_row_values_are_html_escaped():
+    template_data = map_excel_data_to_template({"hotel_name": "<script>alert(1)</script>"})
+    html = voucher_template().render(**template_data)
+    assert "<script>alert(1)</script>" not in html
+    assert "&lt;script&gt;alert(1)&lt;/script&gt;" in html
+
+def make_workbook(sheet_rows):
+    buffer = io.BytesIO()
+    with pd.ExcelWriter(buffer) as writer:
+        for name, rows in sheet_rows.items():
+            pd.DataFrame(rows).to_excel(writer, sheet_name=name, index=False)
+    return buffer.getvalue()
+
+WORKBOOK_SHEETS = {
+    "May": [{"Hotel Name": "Novotel", "Guest Name": "Mr A"}, {"Hotel Name": "Ibis", "Guest Name": None}],
+    "June": [{"Confirmation Number": 77, "Room Type": "Double"}],
+    "Notes": [{"Comment": "not a booking"}],
+}
+
+def test_parse_excel_workbook_selects_sheets_in_workbook_order():
+    contents = make_workbook(WORKBOOK_SHEETS)
+    parsed = parse_excel_workbook(contents, ["June", "May"])
+    assert [sheet["name"] for sheet in parsed] == ["May", "June"]
+    assert parsed[0]["rows"] == [
+        {"hotel_name": "Novotel", "guest_name": "Mr A"},
+        {"hotel_name": "Ibis", "guest_name": ""},
+    ]
+    assert parsed[0]["column_mapping"]["lead_passenger_name"] == "guest_name"
+    assert parsed[1]["rows"] == [{"confirmation_number": "77", "room_type": "Double"}]
+
+    with pytest.raises(ValueError):
+        parse_excel_workbook(contents, ["July"])
+
+def test_parallel_sheet_parsing_matches_single_pass(monkeypatch):
+    contents = make_workbook(WORKBOOK_SHEETS)
+    single_pass = parse_excel_workbook(contents)
+
+    monkeypatch.setattr(vouchers, "SHEET_PARSE_WORKERS", 2)
+    monkeypatch.setattr(vouchers, "SHEET_PARSE_PARALLEL_MIN_BYTES", 0)
+    try:
+        assert parse_excel_workbook(contents) == single_pass
+        assert vouchers._sheet_pool is not None
+    finally:
+        vouchers.shutdown_sheet_pool()
+    assert vouchers._sheet_pool is None